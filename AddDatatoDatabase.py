@@ -1,77 +1,124 @@
-import asyncio
 import mysql.connector
 import argparse
+import csv
 import sys
-from datetime import datetime
+import time
 import os
 import json
 
 
-async def insert_employee_sync(employee_id, employee_data):
-    """Insert a single employee into the database using synchronous connection."""
-    try:
-        # Connect to MySQL
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            passwd="mandip",
-            database="face_recognition"
-        )
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",
+    "passwd": "mandip",
+    "database": "face_recognition",
+}
 
-        cursor = conn.cursor()
+EMPLOYEE_COLUMNS = ("employee_id", "name", "major", "starting_year", "total_attendance", "standing", "year",
+                    "last_attendance_time")
+# People who were never marked get an old last_attendance_time, so their first recognition marks them
+NEVER_ATTENDED = "2000-01-01 00:00:00"
+EMPLOYEE_DEFAULTS = {"total_attendance": 0, "standing": "G", "last_attendance_time": NEVER_ATTENDED}
 
-        # Insert data into MySQL
-        cursor.execute(
-            """
-            INSERT INTO employee (employee_id, name, major, starting_year, total_attendance, standing, year, last_attendance_time)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                employee_id,
-                employee_data["name"],
-                employee_data["major"],
-                employee_data["starting_year"],
-                employee_data["total_attendance"],
-                employee_data["standing"],
-                employee_data["year"],
-                employee_data["last_attendance_time"]
-            )
-        )
+# Re-importing an employee refreshes their profile but keeps the attendance they have built up
+UPSERT_EMPLOYEE_QUERY = f"""
+    INSERT INTO employee ({", ".join(EMPLOYEE_COLUMNS)})
+    VALUES ({", ".join(["%s"] * len(EMPLOYEE_COLUMNS))})
+    ON DUPLICATE KEY UPDATE name = VALUES(name), major = VALUES(major), starting_year = VALUES(starting_year),
+                            standing = VALUES(standing), year = VALUES(year)
+"""
 
-        # Commit the changes
-        conn.commit()
-        print(f"Successfully inserted employee {employee_id}")
 
-        # Close the connection
-        cursor.close()
-        conn.close()
+def connect():
+    return mysql.connector.connect(**DB_CONFIG)
 
-        return True
-    except Exception as e:
-        print(f"Error inserting employee {employee_id}: {str(e)}")
-        return False
 
+def iter_employee_file(path):
+    """Stream employee rows (dicts with an employee_id) from a CSV, JSON-lines or JSON file."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            yield from csv.DictReader(f)
+    elif extension in (".jsonl", ".ndjson"):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        # Plain JSON is loaded whole: either {employee_id: {...}} or a list of rows
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        yield from iter_employee_dict(data) if isinstance(data, dict) else data
 
-async def insert_all_employees(employee_data):
-    """Insert all employees into the database concurrently."""
-    tasks = []
+
+def iter_employee_dict(employee_data):
     for employee_id, data in employee_data.items():
-        tasks.append(insert_employee_sync(employee_id, data))
+        yield {"employee_id": employee_id, **data}
+
+
+def employee_values(row):
+    """Row dict -> INSERT parameters; empty CSV cells become defaults or NULL."""
+    values = []
+    for column in EMPLOYEE_COLUMNS:
+        value = row.get(column)
+        if value is None or value == "":
+            value = EMPLOYEE_DEFAULTS.get(column)
+        values.append(value)
+    if not values[0] or not values[1]:
+        raise ValueError("employee_id and name are required")
+    values[0] = str(values[0])
+    return tuple(values)
+
+
+def bulk_upsert_employees(rows, batch_size=1000, report_interval=5.0):
+    """Upsert employee rows over one connection with one multi-row INSERT per batch."""
+    conn = connect()
+    cursor = conn.cursor()
+    inserted = 0
+    rejected = 0
+    batch = []
+    start = time.perf_counter()
+    last_report = start
 
-    results = await asyncio.gather(*tasks)
-    success_count = sum(1 for result in results if result)
-    print(f"Successfully inserted {success_count} out of {len(employee_data)} employees")
+    def flush():
+        # executemany rewrites INSERT ... VALUES into a single multi-row statement
+        cursor.executemany(UPSERT_EMPLOYEE_QUERY, batch)
+        conn.commit()
+        batch.clear()
+
+    try:
+        for record_number, row in enumerate(rows, 1):
+            try:
+                batch.append(employee_values(row))
+            except (ValueError, AttributeError) as e:
+                rejected += 1
+                print(f"Skipping record {record_number}: {str(e)}")
+                continue
+            if len(batch) >= batch_size:
+                inserted += len(batch)
+                flush()
+                now = time.perf_counter()
+                if now - last_report >= report_interval:
+                    last_report = now
+                    print(f"{inserted} rows ({inserted / (now - start):.0f} rows/s)")
+        if batch:
+            inserted += len(batch)
+            flush()
+    finally:
+        cursor.close()
+        conn.close()
+
+    elapsed = time.perf_counter() - start
+    rate = inserted / elapsed if elapsed else 0.0
+    print(f"Upserted {inserted} employees in {elapsed:.2f}s ({rate:.0f} rows/s), {rejected} rows rejected")
+    return inserted, rejected
 
 
 def create_tables_if_not_exist():
     """Create the necessary database tables if they don't exist."""
     try:
         # Connect to MySQL
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            passwd="mandip",
-            database="face_recognition"
-        )
+        conn = connect()
 
         cursor = conn.cursor()
 
@@ -90,6 +137,48 @@ def create_tables_if_not_exist():
             )
         """)
 
+        # Append-only log of attendance marks; totals are aggregated from it
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS attendance_event (
+                id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                event_key CHAR(32) NOT NULL UNIQUE,
+                employee_id VARCHAR(10) NOT NULL,
+                camera_id VARCHAR(64),
+                ts DATETIME(3) NOT NULL,
+                distance FLOAT,
+                status VARCHAR(20) NOT NULL,
+                created_at DATETIME(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+                INDEX idx_attendance_event_employee_ts (employee_id, ts),
+                INDEX idx_attendance_event_ts (ts)
+            )
+        """)
+
+        # Tables created before idempotency keys existed get the column added
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = 'attendance_event' AND column_name = 'event_key'
+        """)
+        if cursor.fetchone()[0] == 0:
+            cursor.execute("ALTER TABLE attendance_event ADD COLUMN event_key CHAR(32) NULL UNIQUE AFTER id")
+
+        # Per-employee totals folded in from attendance_event by refresh_attendance_summary
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS attendance_summary (
+                employee_id VARCHAR(10) PRIMARY KEY,
+                total_attendance INT NOT NULL DEFAULT 0,
+                last_attendance_time DATETIME(3)
+            )
+        """)
+
+        # Id of the last event folded into attendance_summary
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS attendance_summary_state (
+                id TINYINT PRIMARY KEY,
+                last_event_id BIGINT NOT NULL DEFAULT 0
+            )
+        """)
+        cursor.execute("INSERT IGNORE INTO attendance_summary_state (id, last_event_id) VALUES (1, 0)")
+
         # Commit the changes and close the connection
         conn.commit()
         cursor.close()
@@ -152,24 +241,32 @@ def load_employee_data(json_file=None):
     }
 
 
-async def main():
+def main():
     # Parse command line arguments
     parser = argparse.ArgumentParser(description="Add employee data to the database")
     parser.add_argument('--json', help='Path to a JSON file containing employee data')
+    parser.add_argument('--file', help='Bulk import from a CSV, JSON-lines (.jsonl) or JSON file')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Rows per multi-row INSERT')
     args = parser.parse_args()
 
     # Create tables if they don't exist
     if not create_tables_if_not_exist():
         sys.exit(1)
 
-    # Load employee data
-    data = load_employee_data(args.json)
+    # Stream rows from the import file, or fall back to the JSON/default data
+    if args.file:
+        rows = iter_employee_file(args.file)
+    else:
+        rows = iter_employee_dict(load_employee_data(args.json))
 
-    # Insert all employees into the database
-    await insert_all_employees(data)
+    try:
+        bulk_upsert_employees(rows, args.batch_size)
+    except Exception as e:
+        print(f"Error inserting employees: {str(e)}")
+        sys.exit(1)
 
     print("Data insertion process completed!")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
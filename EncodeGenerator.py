@@ -1,10 +1,21 @@
 import cv2
 import face_recognition
-import pickle
+import argparse
+import hashlib
+import json
+import multiprocessing
 import os
 import sys
+import time
+import numpy as np
 from pathlib import Path
 
+from recognition.gallery_file import load_gallery, write_gallery
+
+GALLERY_PATH = os.path.join("data", "EncodedImages.gallery")
+MANIFEST_PATH = os.path.join("data", "EncodeManifest.json")
+MANIFEST_VERSION = 1
+
 
 def ensure_data_dirs():
     """Ensure all required directories exist."""
@@ -12,71 +23,221 @@ def ensure_data_dirs():
     os.makedirs("data/Capture_Images", exist_ok=True)
 
 
-def find_encoding(images_list):
-    """Extract face encodings from a list of images."""
-    encode_list = []
-    for img in images_list:
-        try:
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            face_locations = face_recognition.face_locations(img)
+def init_encoder_worker():
+    """Keep OpenCV single-threaded inside pool workers so processes don't oversubscribe cores."""
+    cv2.setNumThreads(1)
+
+
+def encode_image_file(img_path):
+    """Read, hash, detect and encode one image.
+
+    Returns (img_path, sha256, encoding, error); encoding is None when the image
+    could not be read or has no usable face.
+    """
+    try:
+        with open(img_path, "rb") as file:
+            raw = file.read()
+        sha256 = hashlib.sha256(raw).hexdigest()
 
-            if not face_locations:
-                print(f"Warning: No face found in one of the images")
-                continue
+        img = cv2.imdecode(np.frombuffer(raw, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            return img_path, sha256, None, "Could not read image"
+
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        face_locations = face_recognition.face_locations(img)
+        if not face_locations:
+            return img_path, sha256, None, "No face found"
+
+        encode = face_recognition.face_encodings(img, face_locations)[0]
+        return img_path, sha256, encode.astype(np.float32), None
+    except Exception as e:
+        return img_path, None, None, f"Error encoding image: {str(e)}"
+
+
+def encode_images(img_paths, workers=None, chunksize=4, report_interval=5.0):
+    """Stream images through a process pool and yield results in input order.
+
+    Paths are fed lazily and only encodings come back, so memory stays bounded
+    by the in-flight chunks rather than the size of the folder.
+    """
+    total = len(img_paths)
+    if total == 0:
+        # Spawning workers that each import dlib is not worth it for nothing
+        return
+    workers = min(workers or os.cpu_count() or 1, total)
+    start = last_report = time.perf_counter()
+
+    with multiprocessing.Pool(workers, initializer=init_encoder_worker) as pool:
+        for done, result in enumerate(pool.imap(encode_image_file, iter(img_paths), chunksize), start=1):
+            now = time.perf_counter()
+            if now - last_report >= report_interval or done == total:
+                rate = done / max(now - start, 1e-9)
+                eta = (total - done) / rate if rate else 0
+                print(f"Encoded {done}/{total} images ({rate:.1f} img/s, {workers} workers, ETA {eta:.0f}s)")
+                last_report = now
+            yield result
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path=MANIFEST_PATH):
+    """Load the per-image manifest (mtime, size, hash and gallery row) from the last run."""
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION:
+            print(f"Warning: Ignoring manifest with unsupported version {manifest.get('version')}")
+            return {}
+        return manifest["images"]
+    except Exception as e:
+        print(f"Warning: Could not read manifest {manifest_path}: {str(e)}")
+        return {}
+
+
+def save_manifest(images, manifest_path=MANIFEST_PATH):
+    """Write the manifest atomically next to the gallery."""
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": MANIFEST_VERSION, "images": images}, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def list_images(folder_path):
+    """Yield (name, path) for Images/<id>.<ext> files and every file of an Images/<id>/ folder.
+
+    Names are the manifest keys: "<id>.<ext>" or "<id>/<file>" for people with several shots.
+    """
+    for entry in sorted(os.listdir(folder_path)):
+        path = os.path.join(folder_path, entry)
+        if os.path.isfile(path):
+            yield entry, path
+        elif os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if os.path.isfile(os.path.join(path, name)):
+                    yield f"{entry}/{name}", os.path.join(path, name)
+
+
+def employee_id_for(name):
+    """Employee ID of a manifest name: the folder for "<id>/<file>", the file stem otherwise."""
+    if "/" in name:
+        return name.split("/", 1)[0]
+    return os.path.splitext(name)[0]
+
+
+def plan_encoding(folder_path, manifest, gallery, full=False):
+    """Split the Images folder into entries reusable from the gallery and files that need encoding."""
+    reused = {}
+    to_encode = []
+    for name, img_path in list_images(folder_path):
+        stat = os.stat(img_path)
+        employee_id = employee_id_for(name)
+        entry = manifest.get(name)
+        if full or entry is None or entry["employee_id"] != employee_id:
+            to_encode.append((name, stat))
+            continue
 
-            encode = face_recognition.face_encodings(img, face_locations)[0]
-            encode_list.append(encode)
-        except Exception as e:
-            print(f"Error encoding image: {str(e)}")
+        # A row only survives if the gallery still holds this ID at that position
+        row = entry["row"]
+        if row is not None and (gallery is None or row >= len(gallery) or gallery.ids[row] != employee_id):
+            to_encode.append((name, stat))
             continue
 
-    return encode_list
+        if entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            reused[name] = entry
+        elif entry["size"] == stat.st_size and entry["sha256"] == file_digest(img_path):
+            # Touched but unchanged content: refresh the cached mtime only
+            reused[name] = dict(entry, mtime=stat.st_mtime)
+        else:
+            to_encode.append((name, stat))
+
+    return reused, to_encode
 
 
 def main():
     """Main function to process images and generate encodings."""
+    parser = argparse.ArgumentParser(description="Generate face encodings for the images in the Images folder")
+    parser.add_argument('--images', default='Images',
+                        help='Folder with <id>.<ext> images or <id>/ folders holding several images per employee')
+    parser.add_argument('--full', action='store_true', help='Re-encode every image and ignore the manifest')
+    parser.add_argument('--workers', type=int, default=None, help='Encoder processes (default: CPU count)')
+    args = parser.parse_args()
+
     # Importing Employee images into a list
-    folder_path = 'Images'
+    folder_path = args.images
     if not os.path.exists(folder_path) or not os.listdir(folder_path):
         print(f"Error: Images folder not found or empty at {os.path.abspath(folder_path)}")
         sys.exit(1)
 
-    image_paths = os.listdir(folder_path)
-    print(f"Found {len(image_paths)} images in {folder_path}")
+    # Make sure data directory exists
+    ensure_data_dirs()
 
-    img_list = []
-    employee_ids = []
-    for path in image_paths:
-        img_path = os.path.join(folder_path, path)
-        img = cv2.imread(img_path)
-        if img is None:
-            print(f"Warning: Could not read image {img_path}")
-            continue
+    manifest = load_manifest()
+    gallery = load_gallery(GALLERY_PATH) if os.path.exists(GALLERY_PATH) else None
+    reused, to_encode = plan_encoding(folder_path, manifest, gallery, args.full)
+    deleted = sorted(set(manifest) - set(reused) - {name for name, _ in to_encode})
 
-        img_list.append(img)
-        employee_ids.append(os.path.splitext(path)[0])
+    print(f"Found {len(reused) + len(to_encode)} images in {folder_path}: "
+          f"{len(reused)} unchanged, {len(to_encode)} new or changed, {len(deleted)} removed")
 
-    print(f"Processing {len(employee_ids)} images with IDs: {employee_ids}")
+    if not to_encode and not deleted and gallery is not None:
+        save_manifest(reused)
+        print("Encoded gallery is up to date")
+        return
 
-    print("Encoding Started...")
-    encode_list_known = find_encoding(img_list)
-    encode_list_known_with_ids = [encode_list_known, employee_ids]
-    print("Encoding Complete")
+    print(f"Encoding Started with {len(to_encode)} images...")
+    img_paths = [os.path.join(folder_path, name) for name, _ in to_encode]
+    results = encode_images(img_paths, workers=args.workers)
 
-    # Make sure data directory exists
-    ensure_data_dirs()
+    # Rebuild the gallery from reused rows plus fresh encodings, keeping IDs and rows aligned
+    encode_list_known = []
+    employee_ids = []
+    new_manifest = {}
+    for name, entry in reused.items():
+        if entry["row"] is not None:
+            # Copy the row: the memory map is released before the gallery file is replaced
+            encode_list_known.append(np.array(gallery.embeddings[entry["row"]]))
+            employee_ids.append(entry["employee_id"])
+            entry = dict(entry, row=len(employee_ids) - 1)
+        new_manifest[name] = entry
+
+    # Results arrive in input order, so appending them keeps rows deterministic
+    for (name, stat), (img_path, sha256, encode, error) in zip(to_encode, results):
+        if sha256 is None:
+            print(f"Warning: {img_path}: {error}")
+            continue
 
-    # Save in both locations for backward compatibility
-    file = open("EncodedImages.pickle", "wb")
-    pickle.dump(encode_list_known_with_ids, file)
-    file.close()
+        entry = {
+            "employee_id": employee_id_for(name),
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "sha256": sha256,
+            "row": None,
+        }
+        # Images without a face are recorded too so they are not retried until they change
+        if encode is not None:
+            encode_list_known.append(encode)
+            employee_ids.append(entry["employee_id"])
+            entry["row"] = len(employee_ids) - 1
+        else:
+            print(f"Warning: {img_path}: {error}")
+        new_manifest[name] = entry
 
-    data_path = os.path.join("data", "EncodedImages.pickle")
-    file = open(data_path, "wb")
-    pickle.dump(encode_list_known_with_ids, file)
-    file.close()
+    print("Encoding Complete")
 
-    print(f"Encoded files saved to:\n- {os.path.abspath('EncodedImages.pickle')}\n- {os.path.abspath(data_path)}")
+    # Release the memory map before the file is replaced (Windows cannot replace a mapped file)
+    gallery = None
+    write_gallery(GALLERY_PATH, encode_list_known, employee_ids)
+    save_manifest(new_manifest)
+    print(f"Encoded gallery saved to: {os.path.abspath(GALLERY_PATH)} ({len(employee_ids)} faces)")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,245 @@
+import argparse
+import csv
+import os
+import shutil
+import sys
+import numpy as np
+
+from AddDatatoDatabase import (UPSERT_EMPLOYEE_QUERY, connect, create_tables_if_not_exist, employee_values,
+                               iter_employee_file)
+from EncodeGenerator import GALLERY_PATH, encode_images, ensure_data_dirs, load_manifest, save_manifest
+from recognition.gallery_file import load_gallery, write_gallery
+
+IMAGE_SEPARATOR = ";"
+
+
+class Candidate:
+    """One manifest row that passed validation and is waiting for its images to be encoded."""
+
+    def __init__(self, record_number, employee_id, values, image_paths):
+        self.record_number = record_number
+        self.employee_id = employee_id
+        self.values = values
+        self.image_paths = image_paths
+        # (image_path, sha256, encoding) of every listed image with a usable face
+        self.faces = []
+        self.errors = []
+
+
+def row_image_paths(row, base_dir):
+    """Image paths of a manifest row: a list (JSON) or a ';'-separated string (CSV), relative to the manifest."""
+    images = row.get("images") or []
+    if isinstance(images, str):
+        images = [path.strip() for path in images.split(IMAGE_SEPARATOR) if path.strip()]
+    return [path if os.path.isabs(path) else os.path.join(base_dir, path) for path in images]
+
+
+def validate_rows(rows, base_dir):
+    """Split manifest rows into candidates and rejects [(record_number, employee_id, reason)]."""
+    candidates = []
+    rejects = []
+    seen = set()
+    for record_number, row in enumerate(rows, 1):
+        employee_id = str(row.get("employee_id") or "") if isinstance(row, dict) else ""
+        try:
+            values = employee_values(row)
+        except (ValueError, AttributeError) as e:
+            rejects.append((record_number, employee_id, str(e)))
+            continue
+        if employee_id in seen:
+            rejects.append((record_number, employee_id, "Duplicate employee_id in manifest"))
+            continue
+
+        image_paths = row_image_paths(row, base_dir)
+        missing = [path for path in image_paths if not os.path.isfile(path)]
+        if not image_paths:
+            rejects.append((record_number, employee_id, "No images listed"))
+        elif missing:
+            rejects.append((record_number, employee_id, f"Image not found: {', '.join(missing)}"))
+        else:
+            seen.add(employee_id)
+            candidates.append(Candidate(record_number, employee_id, values, image_paths))
+    return candidates, rejects
+
+
+def encode_candidates(candidates, workers=None):
+    """Encode every listed image in one parallel pass; a candidate keeps all its images with a face."""
+    flat = [(candidate, path) for candidate in candidates for path in candidate.image_paths]
+    results = encode_images([path for _, path in flat], workers=workers)
+    for (candidate, path), (_, sha256, encoding, error) in zip(flat, results):
+        if encoding is None:
+            candidate.errors.append(f"{os.path.basename(path)}: {error}")
+        else:
+            candidate.faces.append((path, sha256, encoding))
+
+
+def build_gallery(gallery, manifest, enrolled):
+    """Merge enrolled faces into the gallery rows and manifest, replacing earlier entries for the same IDs.
+
+    Returns (encodings, ids, manifest) with the surviving manifest rows renumbered so
+    IDs and embeddings stay aligned.
+    """
+    enrolled_ids = {candidate.employee_id for candidate in enrolled}
+    encodings = []
+    ids = []
+    row_map = {}
+    if gallery is not None:
+        for row, employee_id in enumerate(gallery.ids):
+            if employee_id not in enrolled_ids:
+                row_map[row] = len(ids)
+                encodings.append(np.array(gallery.embeddings[row]))
+                ids.append(employee_id)
+
+    new_manifest = {}
+    for name, entry in manifest.items():
+        if entry["employee_id"] in enrolled_ids:
+            continue
+        if entry["row"] is not None:
+            if entry["row"] not in row_map:
+                continue
+            entry = dict(entry, row=row_map[entry["row"]])
+        new_manifest[name] = entry
+
+    for candidate in enrolled:
+        for _, _, encoding in candidate.faces:
+            encodings.append(encoding)
+            ids.append(candidate.employee_id)
+    return encodings, ids, new_manifest
+
+
+def install_images(enrolled, images_dir, manifest, first_row):
+    """Copy each person's enrolled images to Images/<id>/ and record them in the encoder manifest.
+
+    Images are staged in a side folder first, so re-enrolling from files that
+    already live in Images/<id>/ is safe.
+    """
+    os.makedirs(images_dir, exist_ok=True)
+    row = first_row
+    for candidate in enrolled:
+        employee_id = candidate.employee_id
+        staging_dir = os.path.join(images_dir, f".{employee_id}.enrol")
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        os.makedirs(staging_dir)
+        names = []
+        for number, (image_path, _, _) in enumerate(candidate.faces, start=1):
+            names.append(f"{number}{os.path.splitext(image_path)[1].lower()}")
+            shutil.copy2(image_path, os.path.join(staging_dir, names[-1]))
+
+        # Drop older images of this person so EncodeGenerator does not add them back
+        for old_name in os.listdir(images_dir):
+            old_path = os.path.join(images_dir, old_name)
+            if os.path.isfile(old_path) and os.path.splitext(old_name)[0] == employee_id:
+                os.remove(old_path)
+                manifest.pop(old_name, None)
+        target_dir = os.path.join(images_dir, employee_id)
+        shutil.rmtree(target_dir, ignore_errors=True)
+        for old_name in [name for name in manifest if name.startswith(f"{employee_id}/")]:
+            del manifest[old_name]
+        os.replace(staging_dir, target_dir)
+
+        for name, (_, sha256, _) in zip(names, candidate.faces):
+            stat = os.stat(os.path.join(target_dir, name))
+            manifest[f"{employee_id}/{name}"] = {
+                "employee_id": employee_id,
+                "mtime": stat.st_mtime,
+                "size": stat.st_size,
+                "sha256": sha256,
+                "row": row,
+            }
+            row += 1
+
+
+def commit_enrolment(enrolled, images_dir, batch_size=1000):
+    """Write the database rows and the gallery as one unit.
+
+    The new gallery is staged first and the database transaction committed
+    before the gallery is swapped in. If the database fails nothing changes;
+    the only window left is rows without embeddings, which is harmless and
+    fixed by re-running the enrolment.
+    """
+    manifest = load_manifest()
+    gallery = load_gallery(GALLERY_PATH) if os.path.exists(GALLERY_PATH) else None
+    encodings, ids, manifest = build_gallery(gallery, manifest, enrolled)
+    # Release the memory map before the file is replaced
+    gallery = None
+
+    staged_path = f"{GALLERY_PATH}.enrol"
+    write_gallery(staged_path, encodings, ids)
+    try:
+        conn = connect()
+        cursor = conn.cursor()
+        try:
+            values = [candidate.values for candidate in enrolled]
+            for start in range(0, len(values), batch_size):
+                cursor.executemany(UPSERT_EMPLOYEE_QUERY, values[start:start + batch_size])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+    except Exception:
+        os.remove(staged_path)
+        raise
+
+    os.replace(staged_path, GALLERY_PATH)
+    install_images(enrolled, images_dir, manifest, len(ids) - sum(len(candidate.faces) for candidate in enrolled))
+    save_manifest(manifest)
+    return len(ids)
+
+
+def write_rejects(path, rejects):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["record", "employee_id", "reason"])
+        writer.writerows(rejects)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enrol employees: database records and face encodings in one pass")
+    parser.add_argument('manifest', help='CSV, JSON-lines or JSON file of employee records with an "images" field')
+    parser.add_argument('--images', default='Images', help='Folder the enrolled images are copied into')
+    parser.add_argument('--workers', type=int, default=None, help='Encoder processes (default: CPU count)')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Rows per multi-row INSERT')
+    parser.add_argument('--rejects', help='Write rejected rows and reasons to this CSV file')
+    parser.add_argument('--dry-run', action='store_true', help='Validate and encode without writing anything')
+    args = parser.parse_args()
+
+    ensure_data_dirs()
+    base_dir = os.path.dirname(os.path.abspath(args.manifest))
+    candidates, rejects = validate_rows(iter_employee_file(args.manifest), base_dir)
+    print(f"{len(candidates)} records to encode, {len(rejects)} rejected during validation")
+
+    if candidates:
+        encode_candidates(candidates, workers=args.workers)
+    enrolled = [candidate for candidate in candidates if candidate.faces]
+    for candidate in candidates:
+        if not candidate.faces:
+            rejects.append((candidate.record_number, candidate.employee_id,
+                            "No usable face: " + "; ".join(candidate.errors)))
+    rejects.sort()
+
+    for record_number, employee_id, reason in rejects:
+        print(f"Rejected record {record_number} ({employee_id or 'no id'}): {reason}")
+    if args.rejects:
+        write_rejects(args.rejects, rejects)
+
+    if args.dry_run or not enrolled:
+        print(f"{len(enrolled)} records ready, nothing written")
+        return
+
+    if not create_tables_if_not_exist():
+        sys.exit(1)
+    try:
+        total = commit_enrolment(enrolled, args.images, args.batch_size)
+    except Exception as e:
+        print(f"Error: Enrolment failed, nothing was written: {str(e)}")
+        sys.exit(1)
+    faces = sum(len(candidate.faces) for candidate in enrolled)
+    print(f"Enrolled {len(enrolled)} employees with {faces} faces ({len(rejects)} rejected); "
+          f"gallery now holds {total} faces")
+
+
+if __name__ == "__main__":
+    main()
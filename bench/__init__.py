@@ -0,0 +1,2 @@
+from bench.memory_db import MemoryDatabase
+from bench.synthetic import make_synthetic_gallery, synthetic_embeddings
\ No newline at end of file
@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime
+
+
+class MemoryDatabase:
+    """In-memory stand-in for AsyncDatabase, so the pipeline can be benchmarked without MySQL.
+
+    Implements the calls the recognition path makes. Every employee ID passed
+    in is known; ``latency`` adds an optional simulated round trip per call.
+    """
+
+    def __init__(self, employee_ids=(), latency=0.0):
+        self.latency = latency
+        self.employees = {}
+        self.events = []
+        self.calls = 0
+        self.pool = None
+        for employee_id in employee_ids:
+            self.add_employee(employee_id)
+
+    def add_employee(self, employee_id, name=None, major="Benchmark"):
+        employee_id = str(employee_id)
+        self.employees[employee_id] = {
+            "employee_id": employee_id,
+            "name": name or f"Employee {employee_id}",
+            "major": major,
+            "starting_year": 2020,
+            "total_attendance": 0,
+            "standing": "G",
+            "year": 1,
+            "last_attendance_time": datetime(2000, 1, 1),
+        }
+
+    @property
+    def available(self):
+        return self.pool is not None
+
+    async def _round_trip(self):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def init_pool(self):
+        self.pool = True
+        return True
+
+    def pool_stats(self):
+        return {"size": 1, "in_use": 0, "idle": 1, "calls": self.calls, "events": len(self.events)}
+
+    async def get_employee_info(self, employee_id):
+        await self._round_trip()
+        row = self.employees.get(str(employee_id))
+        return dict(row) if row is not None else None
+
+    async def get_employee_infos(self, employee_ids):
+        await self._round_trip()
+        return {str(employee_id): dict(self.employees[str(employee_id)])
+                for employee_id in employee_ids if str(employee_id) in self.employees}
+
+    async def insert_attendance_events(self, events):
+        await self._round_trip()
+        self.events.extend(events)
+        return len(events)
+
+    async def refresh_attendance_summary(self, settle_seconds=5):
+        return 0
+
+    async def close(self):
+        self.pool = None
@@ -0,0 +1,358 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from bench.memory_db import MemoryDatabase
+from bench.synthetic import make_synthetic_gallery
+from database.async_database import AttendanceWriter
+from recognition.face_detector import FaceRecognition
+from recognition.motion_gate import MotionGate
+from recognition.system import FaceRecognitionSystem
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+DEFAULT_SIZES = (10, 1000, 100000)
+PERCENTILES = (50, 95, 99)
+
+
+def load_frames(source, limit=100, width=None):
+    """Decode up to ``limit`` frames of a video file or an image folder into memory.
+
+    Frames are decoded before timing starts, so decoding never shows up in the stages.
+    """
+    frames = []
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if len(frames) >= limit:
+                break
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                frame = cv2.imread(os.path.join(source, name))
+                if frame is not None:
+                    frames.append(frame)
+    else:
+        cap = cv2.VideoCapture(source)
+        while len(frames) < limit:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+
+    if width:
+        frames = [cv2.resize(frame, (width, int(frame.shape[0] * width / frame.shape[1]))) for frame in frames]
+    return frames
+
+
+class StageTimer:
+    """Wall-clock samples per stage, summarised as exact percentiles."""
+
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+        return timed
+
+    def wrap_async(self, stage, func):
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+        return timed
+
+    def summary(self):
+        stages = {}
+        for stage, samples in self.samples.items():
+            ms = np.asarray(samples) * 1000.0
+            stages[stage] = {"count": len(ms), "mean_ms": float(ms.mean()), "max_ms": float(ms.max())}
+            stages[stage].update({f"p{q}_ms": float(np.percentile(ms, q)) for q in PERCENTILES})
+        return stages
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, or None where the resource module is missing."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class ResourceMeter:
+    """Wall time, process CPU time and peak RSS over a block of work."""
+
+    def __enter__(self):
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall = time.perf_counter() - self.wall_start
+        self.cpu = time.process_time() - self.cpu_start
+
+    def report(self, frames=None):
+        report = {
+            "wall_s": self.wall,
+            "cpu_s": self.cpu,
+            # Above 100% when BLAS or OpenCV run several threads
+            "cpu_percent": 100.0 * self.cpu / self.wall if self.wall else 0.0,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        if frames is not None:
+            report["fps"] = frames / self.wall if self.wall else 0.0
+        return report
+
+
+def bench_matching(face_recognition, queries, batch_sizes=(1, 8)):
+    """Time match_faces_batch alone on perturbed gallery rows, for each query block size."""
+    timer = StageTimer()
+    with ResourceMeter() as meter:
+        for batch_size in batch_sizes:
+            match = timer.wrap(f"match_batch_{batch_size}", face_recognition.match_faces_batch)
+            for start in range(0, len(queries), batch_size):
+                match(queries[start:start + batch_size])
+    return {"stages": timer.summary(), **meter.report()}
+
+
+def bench_recognize(face_recognition, frames):
+    """Time recognize_faces and matching on every frame, without tracking or gating."""
+    timer = StageTimer()
+    recognize = timer.wrap("recognize_faces", face_recognition.recognize_faces)
+    match = timer.wrap("match_faces", face_recognition.match_faces_batch)
+    faces = 0
+    with ResourceMeter() as meter:
+        for frame in frames:
+            faceLocations, encodeCurFace = recognize(frame)
+            faces += len(faceLocations)
+            if len(encodeCurFace):
+                match(encodeCurFace)
+    return {"stages": timer.summary(), "faces": faces, **meter.report(len(frames))}
+
+
+async def bench_pipeline(face_recognition, gallery_path, db, frames, motion_gate=True):
+    """Replay frames through FaceRecognitionSystem.process_frame with every stage timed."""
+    timer = StageTimer()
+    # Instance attributes shadow the methods, so the system calls the timed versions
+    for stage in ("detect_faces", "encode_frames", "match_faces_batch"):
+        setattr(face_recognition, stage, timer.wrap(stage, getattr(face_recognition, stage)))
+    db.get_employee_info = timer.wrap_async("get_employee_info", db.get_employee_info)
+
+    gate = MotionGate() if motion_gate else MotionGate(sensitivity=0.0)
+    attendance_writer = AttendanceWriter(db).start()
+    system = FaceRecognitionSystem(db, face_recognition, gallery_path, motion_gate=gate, camera_id="bench",
+                                   attendance_writer=attendance_writer)
+    process_frame = timer.wrap_async("process_frame", system.process_frame)
+    messages = []
+    system.status_signal.connect(messages.append)
+    try:
+        with ResourceMeter() as meter:
+            for frame in frames:
+                system.set_frame(frame)
+                await process_frame()
+    finally:
+        for stage in ("detect_faces", "encode_frames", "match_faces_batch"):
+            delattr(face_recognition, stage)
+        if system.current_frame is not None:
+            system.current_frame.release()
+        await attendance_writer.stop()
+
+    return {
+        "stages": timer.summary(),
+        "frames_gated": gate.frames_gated,
+        "marks": len(db.events),
+        "status_messages": messages[-10:],
+        **meter.report(len(frames)),
+    }
+
+
+def run_case(label, gallery_path, employee_ids, frames, recognition_options, match_queries=1000,
+             motion_gate=True, seed=0):
+    """Benchmark one gallery; returns the JSON-ready result dict."""
+    load_start = time.perf_counter()
+    face_recognition = FaceRecognition(gallery_path, **recognition_options)
+    result = {
+        "gallery": label,
+        "gallery_rows": len(face_recognition.gallery or []),
+        "identities": len(face_recognition.employeeIds),
+        "load_s": time.perf_counter() - load_start,
+    }
+
+    if len(face_recognition.gallery or []):
+        rng = np.random.default_rng(seed)
+        embeddings = face_recognition.gallery.embeddings
+        picks = rng.choice(len(embeddings), match_queries)
+        queries = np.asarray(embeddings[np.sort(picks)], dtype=np.float32)
+        queries += rng.normal(0.0, 0.03, size=queries.shape).astype(np.float32)
+        result["matching"] = bench_matching(face_recognition, queries)
+
+    if frames:
+        result["recognize"] = bench_recognize(face_recognition, frames)
+        db = MemoryDatabase(employee_ids)
+        asyncio.run(db.init_pool())
+        result["pipeline"] = asyncio.run(bench_pipeline(face_recognition, gallery_path, db, frames, motion_gate))
+    return result
+
+
+def run_benchmark(source=None, sizes=DEFAULT_SIZES, per_person=1, gallery=None, frame_limit=100, width=None,
+                  recognition_options=None, match_queries=1000, motion_gate=True):
+    recognition_options = recognition_options or {}
+    frames = load_frames(source, frame_limit, width) if source else []
+    if source and not frames:
+        raise ValueError(f"No frames could be read from {source}")
+    print(f"Loaded {len(frames)} frames from {source}" if source else "No source given, benchmarking matching only")
+
+    report = {"meta": environment_info(), "config": {
+        "source": source,
+        "frames": len(frames),
+        "width": width,
+        "sizes": list(sizes),
+        "per_person": per_person,
+        "recognition": recognition_options,
+        "match_queries": match_queries,
+        "motion_gate": motion_gate,
+    }, "results": []}
+
+    gallery = os.path.abspath(gallery) if gallery else None
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="frbench-") as workdir:
+        # The pipeline saves captured faces under ./data; keep them out of the caller's tree
+        os.chdir(workdir)
+        try:
+            report["results"] = run_galleries(workdir, sizes, per_person, gallery, frames, recognition_options,
+                                              match_queries, motion_gate)
+        finally:
+            os.chdir(cwd)
+    return report
+
+
+def run_galleries(workdir, sizes, per_person, gallery, frames, recognition_options, match_queries, motion_gate):
+    results = []
+    for people in sizes:
+        gallery_path = os.path.join(workdir, f"synthetic-{people}.gallery")
+        employee_ids = make_synthetic_gallery(gallery_path, people, per_person)
+        print(f"Benchmarking synthetic gallery: {people} people x {per_person}")
+        results.append(run_case(f"synthetic-{people}", gallery_path, employee_ids, frames, recognition_options,
+                                match_queries, motion_gate))
+
+    if gallery:
+        print(f"Benchmarking gallery {gallery}")
+        ids = FaceRecognition(gallery, **recognition_options).employeeIds
+        results.append(run_case(os.path.basename(gallery), gallery, ids, frames, recognition_options,
+                                match_queries, motion_gate))
+    return results
+
+
+def environment_info():
+    try:
+        repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=repo_dir, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+    }
+
+
+def iter_stages(report):
+    """Yield ((gallery, section, stage), stats) for every timed stage in a report."""
+    for result in report["results"]:
+        for section in ("matching", "recognize", "pipeline"):
+            for stage, stats in result.get(section, {}).get("stages", {}).items():
+                yield (result["gallery"], section, stage), stats
+
+
+def print_report(report):
+    print(f"{'gallery':<24}{'section':<11}{'stage':<20}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for (gallery, section, stage), stats in iter_stages(report):
+        print(f"{gallery:<24}{section:<11}{stage:<20}{stats['count']:>7}"
+              f"{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}{stats['p99_ms']:>10.3f}")
+    for result in report["results"]:
+        for section in ("recognize", "pipeline"):
+            if section in result:
+                run = result[section]
+                rss = "-" if run["peak_rss_mb"] is None else f"{run['peak_rss_mb']:.0f} MB"
+                print(f"{result['gallery']:<24}{section:<11}{run['fps']:.1f} frames/s, "
+                      f"CPU {run['cpu_percent']:.0f}%, peak RSS {rss}")
+
+
+def compare_reports(baseline, current):
+    """Print p50/p95 changes of every stage present in both reports; positive means slower."""
+    old = dict(iter_stages(baseline))
+    print(f"Compared with {baseline['meta'].get('commit') or 'baseline'} "
+          f"({baseline['meta'].get('created', 'unknown date')})")
+    print(f"{'gallery':<24}{'section':<11}{'stage':<20}{'p50 ms':>18}{'change':>9}{'p95 change':>12}")
+    for key, stats in iter_stages(current):
+        if key not in old:
+            continue
+        before = old[key]
+        p50_change = (stats["p50_ms"] / before["p50_ms"] - 1) * 100 if before["p50_ms"] else 0.0
+        p95_change = (stats["p95_ms"] / before["p95_ms"] - 1) * 100 if before["p95_ms"] else 0.0
+        gallery, section, stage = key
+        print(f"{gallery:<24}{section:<11}{stage:<20}{before['p50_ms']:>8.3f} ->{stats['p50_ms']:>8.3f}"
+              f"{p50_change:>+8.1f}%{p95_change:>+11.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the recognition pipeline")
+    parser.add_argument('--source', help='Video file or image folder to replay (omit to benchmark matching only)')
+    parser.add_argument('--frames', type=int, default=100, help='Frames to load from the source')
+    parser.add_argument('--width', type=int, default=None, help='Resize frames to this width first')
+    parser.add_argument('--sizes', default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help='Comma-separated synthetic gallery sizes (people)')
+    parser.add_argument('--per-person', type=int, default=1, help='Synthetic embeddings per person')
+    parser.add_argument('--gallery', help='Also benchmark this real gallery file')
+    parser.add_argument('--recognition', default='{}', help='JSON options passed to FaceRecognition')
+    parser.add_argument('--queries', type=int, default=1000, help='Queries for the matching-only section')
+    parser.add_argument('--no-motion-gate', action='store_true', help='Process every replayed frame')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--compare', help='Baseline JSON report to compare against')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    report = run_benchmark(args.source, sizes, args.per_person, args.gallery, args.frames, args.width,
+                           json.loads(args.recognition), args.queries, not args.no_motion_gate)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+        print(f"Report written to {args.output}")
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare_reports(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import os
+import numpy as np
+
+from recognition.gallery_file import write_gallery
+
+
+def synthetic_embeddings(people, per_person=1, dim=128, spread=0.1, jitter=0.03, seed=0):
+    """Random float32 embeddings: one centre per person and per_person noisy rows around it.
+
+    The scale roughly follows dlib's 128-d descriptors, where different people
+    sit ~0.8-1.2 apart and shots of the same person within ~0.4.
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(0.0, spread, size=(people, dim)).astype(np.float32)
+    rows = np.repeat(centres, per_person, axis=0)
+    rows += rng.normal(0.0, jitter, size=rows.shape).astype(np.float32)
+    ids = np.repeat([f"B{number:07d}" for number in range(people)], per_person).tolist()
+    return rows, ids
+
+
+def make_synthetic_gallery(path, people, per_person=1, seed=0):
+    """Write a gallery file with ``people * per_person`` rows and return its employee IDs."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    embeddings, ids = synthetic_embeddings(people, per_person, seed=seed)
+    write_gallery(path, embeddings, ids)
+    return ids
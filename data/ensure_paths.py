@@ -1,16 +1,26 @@
 import os
-import shutil
+
+from recognition.gallery_file import migrate_pickle
+
+GALLERY_PATH = "data/EncodedImages.gallery"
+LEGACY_PICKLE_PATHS = ["data/EncodedImages.pickle", "EncodedImages.pickle"]
+
 
 def ensure_data_paths():
-    """Ensure that all required paths exist and files are copied to the correct locations."""
+    """Ensure that all required paths exist and the encoded gallery is in the current format."""
     # Create required directories
     os.makedirs("data", exist_ok=True)
     os.makedirs("data/Capture_Images", exist_ok=True)
 
-    # If EncodedImages.pickle exists in root but not in data folder, copy it
-    if os.path.exists("EncodedImages.pickle") and not os.path.exists("data/EncodedImages.pickle"):
-        shutil.copy("EncodedImages.pickle", "data/EncodedImages.pickle")
-        print("Copied EncodedImages.pickle to data directory")
+    # Migrate a legacy EncodedImages.pickle into the binary gallery format once
+    if not os.path.exists(GALLERY_PATH):
+        for pickle_path in LEGACY_PICKLE_PATHS:
+            if os.path.exists(pickle_path):
+                try:
+                    migrate_pickle(pickle_path, GALLERY_PATH)
+                    print(f"Migrated {pickle_path} to {GALLERY_PATH}")
+                except ValueError as e:
+                    print(f"Error: not migrating {pickle_path}: {str(e)}")
+                break
 
-    # Return True if encoded images file exists in either location
-    return os.path.exists("EncodedImages.pickle") or os.path.exists("data/EncodedImages.pickle")
+    return os.path.exists(GALLERY_PATH)
@@ -1 +1,3 @@
-from database.async_database import AsyncDatabase
+from database.async_database import AsyncDatabase, AttendanceWriter
+from database.employee_cache import EmployeeCache
+from database.spool import AttendanceSpool, MemorySpool
\ No newline at end of file
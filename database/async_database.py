@@ -1,62 +1,434 @@
+import asyncio
+import contextlib
+import functools
+import time
 import aiomysql
 from datetime import datetime
 
+from database.spool import AttendanceSpool, MemorySpool
+from utils.metrics import REGISTRY
+
+# Totals are the baseline stored on employee plus the aggregate of the attendance_event log
+EMPLOYEE_SELECT = """
+    SELECT e.id, e.employee_id, e.name, e.major, e.starting_year, e.standing, e.year,
+           e.total_attendance + COALESCE(s.total_attendance, 0) AS total_attendance,
+           COALESCE(GREATEST(e.last_attendance_time, s.last_attendance_time),
+                    s.last_attendance_time, e.last_attendance_time) AS last_attendance_time
+    FROM employee e
+    LEFT JOIN attendance_summary s ON s.employee_id = e.employee_id
+"""
+
+
+def timed_call(func):
+    """Observe the duration of every call of an AsyncDatabase coroutine in db_call_seconds."""
+    histogram = REGISTRY.histogram("db_call_seconds", "Seconds per AsyncDatabase call", call=func.__name__)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with histogram.time():
+            return await func(*args, **kwargs)
+    return wrapper
+
 
 class AsyncDatabase:
-    def __init__(self, host='localhost', user='root', passwd='mandip', database='face_recognition'):
+    """aiomysql connection pool with per-query timeouts, a keep-alive ping and pool metrics.
+
+    aiomysql has no read timeout, so every query runs under ``query_timeout``
+    and a connection whose query timed out is closed instead of reused.
+    ``pool_recycle`` replaces connections older than that many seconds, and
+    the keep-alive task pings idle connections every ``ping_interval``
+    seconds so one dropped by the server is reconnected before it is needed.
+    """
+
+    def __init__(self, host='localhost', user='root', passwd='mandip', database='face_recognition', port=3306,
+                 minsize=1, maxsize=10, connect_timeout=5.0, query_timeout=5.0, pool_recycle=3600, autocommit=True,
+                 ping_interval=60.0):
         self.host = host
         self.user = user
         self.passwd = passwd
         self.database = database
+        self.port = port
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self.connect_timeout = connect_timeout
+        self.query_timeout = query_timeout
+        self.pool_recycle = pool_recycle
+        self.autocommit = autocommit
+        self.ping_interval = ping_interval
         self.pool = None
+        self.ping_task = None
+        # Pools of the same database share their metrics in the process-wide registry
+        self.acquire_wait = REGISTRY.histogram("db_acquire_wait_seconds", "Seconds waited for a pooled connection",
+                                               database=database)
+        self.query_latency = REGISTRY.histogram("db_query_seconds", "Seconds per SQL statement", database=database)
+        self.query_timeouts = REGISTRY.counter("db_query_timeouts_total", "Statements cancelled by query_timeout",
+                                               database=database)
+        self.query_errors = REGISTRY.counter("db_query_errors_total", "Statements that raised", database=database)
+        self.ping_failures = REGISTRY.counter("db_ping_failures_total", "Failed keep-alive pings", database=database)
+
+    @property
+    def available(self):
+        return self.pool is not None
 
     async def init_pool(self):
         try:
             self.pool = await aiomysql.create_pool(
                 host=self.host,
+                port=self.port,
                 user=self.user,
                 password=self.passwd,
-                db=self.database
+                db=self.database,
+                minsize=self.minsize,
+                maxsize=self.maxsize,
+                connect_timeout=self.connect_timeout,
+                pool_recycle=self.pool_recycle,
+                autocommit=self.autocommit
             )
+            if self.ping_interval and self.ping_task is None:
+                self.ping_task = asyncio.create_task(self._keep_alive())
             return True
         except Exception as e:
             print(f"Database connection error: {str(e)}")
             return False
 
+    @contextlib.asynccontextmanager
+    async def connection(self):
+        """Acquire a pooled connection, recording how long the wait took."""
+        start = time.perf_counter()
+        conn = await asyncio.wait_for(self.pool.acquire(), self.connect_timeout)
+        self.acquire_wait.observe(time.perf_counter() - start)
+        try:
+            yield conn
+        except asyncio.TimeoutError:
+            # The timed-out query may still be running on this connection
+            conn.close()
+            raise
+        finally:
+            self.pool.release(conn)
+
+    async def execute(self, cursor, query, args=None, many=False):
+        start = time.perf_counter()
+        try:
+            if many:
+                await asyncio.wait_for(cursor.executemany(query, args), self.query_timeout)
+            else:
+                await asyncio.wait_for(cursor.execute(query, args), self.query_timeout)
+        except asyncio.TimeoutError:
+            self.query_timeouts.inc()
+            raise
+        except Exception:
+            self.query_errors.inc()
+            raise
+        finally:
+            self.query_latency.observe(time.perf_counter() - start)
+
+    async def _keep_alive(self):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            # Free connections rotate through the pool, so this pings each idle one once
+            for _ in range(self.pool.freesize):
+                try:
+                    async with self.connection() as conn:
+                        await asyncio.wait_for(conn.ping(reconnect=True), self.query_timeout)
+                except Exception:
+                    self.ping_failures.inc()
+
+    def pool_stats(self):
+        size = self.pool.size if self.pool else 0
+        idle = self.pool.freesize if self.pool else 0
+        return {
+            "size": size,
+            "in_use": size - idle,
+            "idle": idle,
+            "minsize": self.minsize,
+            "maxsize": self.maxsize,
+            "acquire_wait": self.acquire_wait.snapshot(),
+            "query_latency": self.query_latency.snapshot(),
+            "query_timeouts": self.query_timeouts.value,
+            "query_errors": self.query_errors.value,
+            "ping_failures": self.ping_failures.value,
+        }
+
+    @timed_call
     async def get_employee_info(self, employee_id):
         if not self.pool:
             return None
 
-        async with self.pool.acquire() as conn:
+        async with self.connection() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
-                query = "SELECT * FROM employee WHERE employee_id = %s"
-                await cursor.execute(query, (employee_id,))
+                query = EMPLOYEE_SELECT + " WHERE e.employee_id = %s"
+                await self.execute(cursor, query, (employee_id,))
                 result = await cursor.fetchone()
                 return result
 
-    async def update_employee_attendance(self, employee_id, new_attendance):
+    @timed_call
+    async def get_employee_infos(self, employee_ids):
+        """Fetch many employees in one query; returns {employee_id: row}."""
+        if not self.pool or not employee_ids:
+            return {}
+
+        async with self.connection() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                placeholders = ", ".join(["%s"] * len(employee_ids))
+                query = EMPLOYEE_SELECT + f" WHERE e.employee_id IN ({placeholders})"
+                await self.execute(cursor, query, tuple(employee_ids))
+                rows = await cursor.fetchall()
+                return {str(row["employee_id"]): row for row in rows}
+
+    @timed_call
+    async def insert_attendance_events(self, events):
+        """Append events [(event_key, employee_id, camera_id, ts, distance, status), ...] to attendance_event.
+
+        Events whose event_key is already stored are skipped, so replaying a batch is harmless.
+        """
         if not self.pool:
             return False
 
-        async with self.pool.acquire() as conn:
+        async with self.connection() as conn:
             async with conn.cursor() as cursor:
-                query = "UPDATE employee SET total_attendance = %s WHERE employee_id = %s"
-                await cursor.execute(query, (new_attendance, employee_id))
+                # executemany turns INSERT ... VALUES into a single multi-row statement
+                query = ("INSERT INTO attendance_event (event_key, employee_id, camera_id, ts, distance, status) "
+                         "VALUES (%s, %s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE id = id")
+                await self.execute(cursor, query, events, many=True)
                 await conn.commit()
                 return True
 
-    async def update_employee_last_attendance_time(self, employee_id, last_new_attendance_time):
+    @timed_call
+    async def refresh_attendance_summary(self, settle_seconds=5):
+        """Fold events logged since the last refresh into attendance_summary; returns the last folded event id."""
         if not self.pool:
-            return False
+            return None
 
-        async with self.pool.acquire() as conn:
+        async with self.connection() as conn:
             async with conn.cursor() as cursor:
-                query = "UPDATE employee SET last_attendance_time = %s WHERE employee_id = %s"
-                await cursor.execute(query, (last_new_attendance_time, employee_id))
-                await conn.commit()
-                return True
+                try:
+                    await conn.begin()
+                    # The state row lock keeps concurrent refreshes from folding the same events twice
+                    await self.execute(cursor,
+                                       "SELECT last_event_id FROM attendance_summary_state WHERE id = 1 FOR UPDATE")
+                    row = await cursor.fetchone()
+                    start = row[0] if row else 0
+                    # Skip the newest events: a batch holding lower ids may not have committed yet
+                    await self.execute(cursor, "SELECT MAX(id) FROM attendance_event "
+                                               "WHERE id > %s AND created_at < NOW(3) - INTERVAL %s SECOND",
+                                       (start, settle_seconds))
+                    end = (await cursor.fetchone())[0]
+                    if end is None:
+                        await conn.rollback()
+                        return start
+
+                    await self.execute(cursor, """
+                        INSERT INTO attendance_summary (employee_id, total_attendance, last_attendance_time)
+                        SELECT * FROM (
+                            SELECT employee_id, COUNT(*) AS marks, MAX(ts) AS last_ts
+                            FROM attendance_event
+                            WHERE id > %s AND id <= %s AND status = 'MARKED'
+                            GROUP BY employee_id
+                        ) AS batch
+                        ON DUPLICATE KEY UPDATE
+                            total_attendance = attendance_summary.total_attendance + batch.marks,
+                            last_attendance_time = GREATEST(COALESCE(attendance_summary.last_attendance_time,
+                                                                     batch.last_ts), batch.last_ts)
+                    """, (start, end))
+                    await self.execute(cursor, "INSERT INTO attendance_summary_state (id, last_event_id) "
+                                               "VALUES (1, %s) ON DUPLICATE KEY UPDATE last_event_id = %s",
+                                       (end, end))
+                    await conn.commit()
+                    return end
+                except asyncio.TimeoutError:
+                    # The connection is closed on the way out; the server rolls the transaction back
+                    raise
+                except Exception:
+                    await conn.rollback()
+                    raise
 
     async def close(self):
+        if self.ping_task:
+            self.ping_task.cancel()
+            self.ping_task = None
         if self.pool:
             self.pool.close()
-            await self.pool.wait_closed()
\ No newline at end of file
+            await self.pool.wait_closed()
+
+
+class AttendanceWriter:
+    """Write-behind queue of attendance marks, drained to the database off the recognition path.
+
+    mark() appends the event to a local spool (SQLite when ``spool_path`` is
+    given, otherwise in memory) and returns at once. A background task
+    replays spooled events to attendance_event with one multi-row INSERT
+    when ``batch_size`` events are waiting or ``flush_interval`` seconds after
+    the first one; events carry idempotency keys, so a batch retried after a
+    failure is never counted twice. While the database is unreachable the
+    drainer backs off and retries, reconnecting the pool if it never came up.
+    The log is folded into attendance_summary every ``summary_interval`` seconds,
+    and once more after the last write when marks stop coming in, so totals
+    never stay stale through a quiet period.
+    """
+
+    def __init__(self, db, batch_size=50, flush_interval=1.0, max_queue=10000, summary_interval=60.0,
+                 spool_path=None, retry_delay=1.0, max_retry_delay=30.0, settle_seconds=5):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.summary_interval = summary_interval
+        self.settle_seconds = settle_seconds
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.spool = AttendanceSpool(spool_path) if spool_path else MemorySpool(max_queue)
+        self.last_summary = time.monotonic()
+        self.last_written = None
+        # Written events not folded into attendance_summary yet
+        self.unsettled = False
+        self.wake = asyncio.Event()
+        self.stopping = False
+        self.task = None
+        # Marks not yet folded into attendance_summary, so callers do not mark the same person twice meanwhile
+        self.pending = {}
+        # {employee_id: (marked_at, monotonic write time)} of pending marks already in attendance_event
+        self.written = {}
+        self.marks_queued = 0
+        self.marks_written = 0
+        self.failed_batches = 0
+        self.marks_dropped = 0
+        self.batches = 0
+        self.db_down = False
+
+    def start(self):
+        if self.task is None:
+            self.stopping = False
+            self.task = asyncio.create_task(self._run())
+        return self
+
+    def mark(self, employee_id, camera_id=None, distance=None, status="MARKED", marked_at=None):
+        """Spool one attendance event; returns False if the spool refused it."""
+        marked_at = marked_at or datetime.now()
+        try:
+            self.spool.append(employee_id, camera_id, marked_at, distance, status)
+        except Exception as e:
+            self.marks_dropped += 1
+            print(f"Attendance spool error, dropped mark for {employee_id}: {str(e)}")
+            return False
+        self.pending[employee_id] = marked_at
+        self.marks_queued += 1
+        self.wake.set()
+        return True
+
+    def pending_since(self, employee_id):
+        """Time of a mark for employee_id not yet reflected in attendance_summary, or None."""
+        return self.pending.get(employee_id)
+
+    async def _wait(self, timeout):
+        self.wake.clear()
+        try:
+            await asyncio.wait_for(self.wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        delay = self.retry_delay
+        while True:
+            if len(self.spool) == 0:
+                if self.stopping:
+                    return
+                # Fold the last written events once they have settled, even if no new marks come in
+                await self._wait(self._summary_due() if self.unsettled else None)
+                if self.unsettled and self._summary_due() <= 0:
+                    await self.refresh_summary()
+                continue
+
+            # Give a partial batch up to flush_interval to fill up
+            deadline = time.monotonic() + self.flush_interval
+            while not self.stopping and len(self.spool) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                await self._wait(remaining)
+
+            if await self.flush():
+                delay = self.retry_delay
+                if time.monotonic() - self.last_summary >= self.summary_interval:
+                    await self.refresh_summary()
+            elif self.stopping:
+                # Whatever is left stays in the spool for the next run
+                return
+            else:
+                await self._wait(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+
+    async def flush(self):
+        """Replay the oldest spooled batch; returns True when it reached the database."""
+        rows = self.spool.peek(self.batch_size)
+        if not rows:
+            return True
+        if not self.db.available:
+            await self.db.init_pool()
+
+        try:
+            written = await self.db.insert_attendance_events([row[1:] for row in rows])
+        except Exception as e:
+            written = False
+            if not self.db_down:
+                print(f"Attendance write error, spooling locally: {str(e)}")
+        self.batches += 1
+        if not written:
+            self.failed_batches += 1
+            self.db_down = True
+            return False
+
+        if self.db_down:
+            print(f"Database reachable again, replaying {len(self.spool)} spooled attendance events")
+            self.db_down = False
+        self.spool.ack(rows[-1][0])
+        self.marks_written += len(rows)
+        self.last_written = time.monotonic()
+        self.unsettled = True
+        for _, _, employee_id, _, marked_at, _, _ in rows:
+            if self.pending.get(employee_id) == marked_at:
+                self.written[employee_id] = (marked_at, self.last_written)
+        return True
+
+    def _summary_due(self):
+        """Seconds until the next refresh: summary_interval after the last one, and settled past the last write."""
+        due = max(self.last_summary + self.summary_interval, (self.last_written or 0) + self.settle_seconds)
+        return max(0.0, due - time.monotonic())
+
+    async def refresh_summary(self):
+        started = time.monotonic()
+        self.last_summary = started
+        try:
+            folded = await self.db.refresh_attendance_summary(self.settle_seconds)
+        except Exception as e:
+            print(f"Attendance summary refresh error: {str(e)}")
+            return
+        if folded is None:
+            return
+        # The refresh folds events written more than settle_seconds before it started;
+        # later ones, and marks still in the spool however old, wait for the next refresh
+        settled = started - self.settle_seconds
+        self.unsettled = self.last_written is not None and self.last_written >= settled
+        for employee_id, (marked_at, written_at) in list(self.written.items()):
+            if written_at < settled:
+                del self.written[employee_id]
+                if self.pending.get(employee_id) == marked_at:
+                    del self.pending[employee_id]
+
+    async def stop(self):
+        """Try to write whatever is still spooled, then stop the background task."""
+        if self.task is None:
+            return
+        self.stopping = True
+        self.wake.set()
+        await self.task
+        self.task = None
+
+    def stats(self):
+        return {
+            "spooled": len(self.spool),
+            "marks_queued": self.marks_queued,
+            "marks_written": self.marks_written,
+            "failed_batches": self.failed_batches,
+            "marks_dropped": self.marks_dropped,
+            "batches": self.batches,
+            "db_down": self.db_down,
+        }
\ No newline at end of file
@@ -0,0 +1,85 @@
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+
+class EmployeeCache:
+    """Read-through cache of employee rows in front of AsyncDatabase, with TTL and LRU eviction.
+
+    Exposes the same get_employee_info() as AsyncDatabase so it can stand in
+    for it. Rows are returned as copies; attendance marks are written through
+    with record_attendance() so a cached row never lags the marks we made.
+    """
+
+    def __init__(self, db, ttl=300.0, max_size=10000, warm_chunk_size=1000):
+        self.db = db
+        self.ttl = ttl
+        self.max_size = max_size
+        self.warm_chunk_size = warm_chunk_size
+        # employee_id -> (expires_at, row); row is None for IDs the database does not know
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _store(self, employee_id, row):
+        self.entries[employee_id] = (time.monotonic() + self.ttl, row)
+        self.entries.move_to_end(employee_id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_employee_info(self, employee_id):
+        entry = self.entries.get(employee_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            self.entries.move_to_end(employee_id)
+            row = entry[1]
+            return dict(row) if row is not None else None
+
+        self.misses += 1
+        row = await self.db.get_employee_info(employee_id)
+        # A None while the database is down means "unknown", not "no such employee"
+        if row is not None or self.db.available:
+            self._store(employee_id, row)
+        return dict(row) if row is not None else None
+
+    async def warm(self, employee_ids):
+        """Load every given employee with one IN query per chunk; returns how many rows were cached."""
+        if not self.db.available:
+            return 0
+        employee_ids = list(dict.fromkeys(employee_ids))
+        loaded = 0
+        for start in range(0, len(employee_ids), self.warm_chunk_size):
+            chunk = employee_ids[start:start + self.warm_chunk_size]
+            rows = await self.db.get_employee_infos(chunk)
+            for employee_id in chunk:
+                row = rows.get(employee_id)
+                self._store(employee_id, row)
+                loaded += row is not None
+        return loaded
+
+    def record_attendance(self, employee_id, marks=1, marked_at=None):
+        """Write-through of an attendance mark to the cached row, if there is one."""
+        entry = self.entries.get(employee_id)
+        if entry is None or entry[1] is None:
+            return
+        row = entry[1]
+        row["total_attendance"] = row["total_attendance"] + marks
+        row["last_attendance_time"] = marked_at or datetime.now()
+
+    def invalidate(self, employee_id=None):
+        if employee_id is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(employee_id, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,94 @@
+import os
+import sqlite3
+import uuid
+from collections import deque
+from datetime import datetime
+
+DEFAULT_SPOOL_PATH = "data/attendance_spool.db"
+
+# Spooled rows are (seq, event_key, employee_id, camera_id, ts, distance, status)
+
+
+def new_event_key():
+    """Idempotency key stored with every event so a replayed batch is never counted twice."""
+    return uuid.uuid4().hex
+
+
+class AttendanceSpool:
+    """Durable local queue of attendance events in SQLite (WAL mode).
+
+    Events are committed locally before the caller continues, so marks made
+    while MySQL is slow or down survive a restart and are replayed later.
+    """
+
+    def __init__(self, path=DEFAULT_SPOOL_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # WAL with synchronous=NORMAL survives process crashes without an fsync per mark
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS spool (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                event_key TEXT UNIQUE NOT NULL,
+                employee_id TEXT NOT NULL,
+                camera_id TEXT,
+                ts TEXT NOT NULL,
+                distance REAL,
+                status TEXT NOT NULL
+            )
+        """)
+
+    def append(self, employee_id, camera_id, ts, distance, status):
+        event_key = new_event_key()
+        self.conn.execute("INSERT INTO spool (event_key, employee_id, camera_id, ts, distance, status) "
+                          "VALUES (?, ?, ?, ?, ?, ?)",
+                          (event_key, employee_id, camera_id, ts.isoformat(), distance, status))
+        return event_key
+
+    def peek(self, limit):
+        rows = self.conn.execute("SELECT seq, event_key, employee_id, camera_id, ts, distance, status FROM spool "
+                                 "ORDER BY seq LIMIT ?", (limit,)).fetchall()
+        return [(seq, key, employee_id, camera_id, datetime.fromisoformat(ts), distance, status)
+                for seq, key, employee_id, camera_id, ts, distance, status in rows]
+
+    def ack(self, last_seq):
+        """Drop every event up to and including last_seq once it is safely in MySQL."""
+        self.conn.execute("DELETE FROM spool WHERE seq <= ?", (last_seq,))
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+class MemorySpool:
+    """In-memory stand-in for AttendanceSpool with the same interface, for tests and throwaway runs."""
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.rows = deque()
+        self.seq = 0
+
+    def append(self, employee_id, camera_id, ts, distance, status):
+        if len(self.rows) >= self.max_size:
+            raise OverflowError(f"Attendance spool is full ({self.max_size} events)")
+        self.seq += 1
+        event_key = new_event_key()
+        self.rows.append((self.seq, event_key, employee_id, camera_id, ts, distance, status))
+        return event_key
+
+    def peek(self, limit):
+        return [self.rows[i] for i in range(min(limit, len(self.rows)))]
+
+    def ack(self, last_seq):
+        while self.rows and self.rows[0][0] <= last_seq:
+            self.rows.popleft()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def close(self):
+        pass
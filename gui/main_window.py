@@ -1,17 +1,41 @@
 import os
 import asyncio
+import time
 import cv2
 from PyQt6.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QFrame
 from PyQt6.QtCore import Qt, QEvent
 from PyQt6.QtGui import QImage, QPixmap
 
-from database.async_database import AsyncDatabase
-from recognition.face_detector import FaceRecognition
+from data.ensure_paths import GALLERY_PATH
+from database.async_database import AsyncDatabase, AttendanceWriter
+from database.employee_cache import EmployeeCache
+from database.spool import DEFAULT_SPOOL_PATH
+from recognition.identities import gallery_identities
+from recognition.rate_controller import RateController, RateGroup
+from recognition.roi import parse_regions
 from recognition.system import FaceRecognitionSystem
+from recognition.workers import RecognitionWorkerPool
+from utils.frame_pool import COPY_STATS
+from utils.metrics import REGISTRY
 from utils.video_thread import VideoThread
 
+DISPLAY_TIME = REGISTRY.histogram("gui_display_seconds", "Seconds to convert and show a processed frame")
+
 
 class AttendanceSystemGUI(QMainWindow):
+    # Recognition runs in worker processes so dlib never blocks the GUI event loop
+    recognition_workers = 1
+    # Camera backend, resolution, FPS and FOURCC (e.g. "MJPG") passed to the capture thread
+    capture_options = {"source": 0, "width": 640, "height": 480, "backend": "any", "fps": None, "fourcc": None}
+    # Frames grabbed longer ago than this are skipped instead of processed late
+    max_frame_age = 0.5
+    # Latency budget and rate bounds of the adaptive processing loop (see RateController)
+    rate_options = {"latency_budget": 0.3, "max_fps": 10.0, "min_fps": 1.0}
+    # Regions of interest detection is restricted to, e.g. [{"rect": [0.2, 0.3, 0.6, 0.5], "scale": 0.5}]
+    roi = []
+    # Seconds between rate/latency updates of the status line
+    rate_report_interval = 5.0
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Face Recognition Attendance System")
@@ -24,7 +48,9 @@ class AttendanceSystemGUI(QMainWindow):
         # Initialize variables
         self.video_thread = None
         self.face_recognition_system = None
+        self.worker_pool = None
         self.db = None
+        self.attendance_writer = None
         self.timer = None
         self.is_running = False
 
@@ -233,20 +259,34 @@ class AttendanceSystemGUI(QMainWindow):
         db_success = await self.db.init_pool()
 
         if not db_success:
-            self.status_label_main.setText("System Status: Database Connection Failed")
-            self.start_button.setEnabled(True)
-            return
-
-        # Initialize face recognition system
-        face_detector = FaceRecognition("EncodedImages.pickle")
-        self.face_recognition_system = FaceRecognitionSystem(self.db, face_detector, "EncodedImages.pickle")
+            # Keep running: marks are spooled locally and replayed once the database is back
+            self.status_label_main.setText("System Status: Database unavailable, spooling attendance locally")
+
+        # Attendance marks are spooled and written in batches so the frame loop never waits on MySQL
+        self.attendance_writer = AttendanceWriter(self.db, spool_path=DEFAULT_SPOOL_PATH).start()
+
+        # Start recognition workers without blocking the event loop while they load
+        self.worker_pool = RecognitionWorkerPool({"encoded_image_path": GALLERY_PATH}, workers=self.recognition_workers)
+        await asyncio.get_running_loop().run_in_executor(None, self.worker_pool.start)
+        self.worker_pool.register_camera("camera-0", {"roi": self.roi})
+
+        # Recognition runs in the workers; the GUI process only needs the gallery's employee IDs
+        employee_ids = gallery_identities(GALLERY_PATH).ids
+
+        # Load every gallery identity up front so recognition causes no per-face SELECTs
+        employee_cache = EmployeeCache(self.db)
+        await employee_cache.warm(employee_ids)
+        self.face_recognition_system = FaceRecognitionSystem(self.db, None, GALLERY_PATH,
+                                                             camera_id="camera-0", worker_pool=self.worker_pool,
+                                                             attendance_writer=self.attendance_writer,
+                                                             employee_cache=employee_cache,
+                                                             regions=parse_regions(self.roi))
         self.face_recognition_system.face_detected_signal.connect(self.update_employee_info)
         self.face_recognition_system.status_signal.connect(self.update_status)
         self.face_recognition_system.processed_frame_signal.connect(self.update_processed_frame)
 
         # Start video thread
-        self.video_thread = VideoThread()
-        self.video_thread.change_pixmap_signal.connect(self.update_video_feed)
+        self.video_thread = VideoThread(**self.capture_options)
         self.video_thread.error_signal.connect(self.update_status)
         self.video_thread.start()
 
@@ -254,7 +294,8 @@ class AttendanceSystemGUI(QMainWindow):
         self.timer = asyncio.create_task(self.process_frames_periodically())
 
         # Update UI
-        self.status_label_main.setText("System Status: Running")
+        self.status_label_main.setText("System Status: Running" if employee_ids
+                                       else "System Status: Running - No encoded faces available")
         self.start_button.setEnabled(False)
         self.stop_button.setEnabled(True)
         self.is_running = True
@@ -273,15 +314,31 @@ class AttendanceSystemGUI(QMainWindow):
         asyncio.create_task(self.start_recognition_async())
 
     async def process_frames_periodically(self):
+        last_sequence = None
+        # Rate and detection scale follow the measured processing time instead of a fixed 10 FPS
+        rate = RateController(**self.rate_options, group=RateGroup(capacity=self.recognition_workers or 1),
+                              name="camera-0")
+        last_report = time.monotonic()
         try:
             while self.is_running:
-                if self.face_recognition_system:
-                    await self.face_recognition_system.process_frame()
-                await asyncio.sleep(0.1)  # Process at 10 FPS
+                if self.face_recognition_system and self.video_thread:
+                    # Pull the newest frame; anything grabbed while we were busy is skipped
+                    frame, sequence = self.video_thread.latest(since=last_sequence, max_age=self.max_frame_age)
+                    if frame is not None:
+                        last_sequence = sequence
+                        await rate.process(self.face_recognition_system, frame, sequence)
+                if time.monotonic() - last_report >= self.rate_report_interval:
+                    last_report = time.monotonic()
+                    stats = rate.stats()
+                    self.update_status(f"Running - {stats['fps']:.1f} FPS, {stats['latency_ms']:.0f} ms latency, "
+                                       f"{stats['frames_dropped']} frames dropped")
+                await rate.wait()
         except asyncio.CancelledError:
             pass
         except Exception as e:
             self.update_status(f"Processing error: {str(e)}")
+        finally:
+            rate.close()
 
     async def stop_recognition_async(self):
         self.is_running = False
@@ -296,6 +353,16 @@ class AttendanceSystemGUI(QMainWindow):
             self.video_thread.stop()
             self.video_thread = None
 
+        # Stop recognition workers
+        if self.worker_pool:
+            await asyncio.get_running_loop().run_in_executor(None, self.worker_pool.stop)
+            self.worker_pool = None
+
+        # Write queued attendance marks before closing the database
+        if self.attendance_writer:
+            await self.attendance_writer.stop()
+            self.attendance_writer = None
+
         # Close database connection
         if self.db:
             await self.db.close()
@@ -313,18 +380,15 @@ class AttendanceSystemGUI(QMainWindow):
     def stop_recognition(self):
         asyncio.create_task(self.stop_recognition_async())
 
-    def update_video_feed(self, frame):
-        if self.face_recognition_system:
-            self.face_recognition_system.set_frame(frame)
-
     def update_processed_frame(self, frame):
-        # Convert frame to QPixmap and display
-        rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_image.shape
-        bytes_per_line = ch * w
-        convert_to_qt_format = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-        pixmap = QPixmap.fromImage(convert_to_qt_format)
-        self.video_label.setPixmap(pixmap)
+        # Wrap the BGR overlay buffer as-is; the pixmap conversion is the only copy
+        with DISPLAY_TIME.time():
+            h, w, ch = frame.shape
+            bytes_per_line = ch * w
+            convert_to_qt_format = QImage(frame.data, w, h, bytes_per_line, QImage.Format.Format_BGR888)
+            pixmap = QPixmap.fromImage(convert_to_qt_format)
+            COPY_STATS.record("display", frame.nbytes)
+            self.video_label.setPixmap(pixmap)
 
     def update_employee_info(self, info):
         # Update employee information
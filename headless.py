@@ -0,0 +1,246 @@
+import argparse
+import asyncio
+import json
+import signal
+import sys
+import time
+
+from data.ensure_paths import GALLERY_PATH, ensure_data_paths
+from database.async_database import AsyncDatabase, AttendanceWriter
+from database.employee_cache import EmployeeCache
+from database.spool import DEFAULT_SPOOL_PATH
+from recognition.batcher import EncodingBatcher
+from recognition.face_detector import FaceRecognition
+from recognition.identities import gallery_identities
+from recognition.motion_gate import MotionGate
+from recognition.rate_controller import RateController, RateGroup
+from recognition.roi import parse_regions
+from recognition.system import FaceRecognitionSystem
+from recognition.tracker import FaceTracker
+from recognition.workers import RecognitionWorkerPool
+from utils.capture import CaptureSource
+from utils.frame_pool import COPY_STATS
+from utils.metrics import MetricsDumper, start_metrics_server
+
+DEFAULT_CONFIG = {
+    "gallery": GALLERY_PATH,
+    "recognition": {},
+    "database": {},
+    "attendance": {},
+    "employee_cache": {},
+    "metrics": {},
+    "batching": {},
+    "process_fps": 10,
+    "workers": 0,
+    "cameras": [{"id": "camera-0", "source": 0}],
+}
+
+
+def load_config(config_file=None):
+    """Load the service config from a JSON file, falling back to a single local camera."""
+    config = dict(DEFAULT_CONFIG)
+    if config_file:
+        with open(config_file, 'r') as f:
+            config.update(json.load(f))
+    return config
+
+
+class CameraWorker:
+    """Runs one source through capture -> detect -> match -> attendance on the shared event loop."""
+    # Seconds between rate/latency log lines
+    report_interval = 60.0
+
+    def __init__(self, camera, db, face_recognition, process_fps, worker_pool=None, attendance_writer=None,
+                 employee_cache=None, rate_group=None, batcher=None):
+        self.camera_id = str(camera["id"])
+        self.capture = CaptureSource(camera["source"], width=camera.get("width", 640), height=camera.get("height", 480),
+                                     loop=camera.get("loop", False), name=f"capture-{self.camera_id}",
+                                     backend=camera.get("backend", "any"), fps=camera.get("fps"),
+                                     fourcc=camera.get("fourcc"))
+        # Frames grabbed longer ago than this are skipped instead of processed late
+        self.max_frame_age = camera.get("max_frame_age", 0.5)
+        # Detection only scans the configured regions of interest (the whole frame without any)
+        regions = parse_regions(camera.get("roi"))
+        self.system = FaceRecognitionSystem(db, face_recognition, None,
+                                            tracker=FaceTracker(**camera.get("tracker", {})),
+                                            motion_gate=MotionGate(**camera.get("motion_gate", {})),
+                                            camera_id=self.camera_id, worker_pool=worker_pool,
+                                            attendance_writer=attendance_writer, employee_cache=employee_cache,
+                                            regions=regions, batcher=batcher)
+        if worker_pool is not None:
+            worker_pool.register_camera(self.camera_id, {"tracker": camera.get("tracker", {}),
+                                                         "motion_gate": camera.get("motion_gate", {}),
+                                                         "roi": camera.get("roi")})
+        self.system.status_signal.connect(self.log)
+        self.system.face_detected_signal.connect(self.log_detection)
+        # Processing rate and detection scale adapt to load; process_fps is the upper bound
+        self.rate = RateController(**{"max_fps": camera.get("process_fps", process_fps), **camera.get("rate", {})},
+                                   group=rate_group, name=self.camera_id)
+        self.last_sequence = 0
+        self.last_error = None
+        if regions:
+            width, height = camera.get("width", 640), camera.get("height", 480)
+            scanned = min(1.0, sum(region.area_ratio(width, height) for region in regions))
+            self.log(f"Detecting in {len(regions)} region(s), {scanned:.0%} of the frame")
+
+    def log(self, message):
+        print(f"[{self.camera_id}] {message}", flush=True)
+
+    def log_detection(self, info):
+        self.log(f"{info['employee_id']} ({info['name']}): {info['status']}")
+
+    def report(self):
+        stats = self.rate.stats()
+        self.log(f"{stats['fps']:.1f} FPS (target {stats['target_fps']:.1f}), "
+                 f"latency {stats['latency_ms']:.0f} ms (p95 {stats['latency_p95_ms']:.0f} ms), "
+                 f"{stats['frames_dropped']} frames dropped, detect scale {stats['detect_scale']:g}")
+
+    async def run(self):
+        self.capture.start()
+        last_report = time.monotonic()
+        try:
+            while self.capture.running or self.capture.is_alive():
+                # Only frames we have not seen yet are returned
+                frame, sequence = self.capture.latest(since=self.last_sequence, max_age=self.max_frame_age)
+                if self.capture.error != self.last_error:
+                    self.last_error = self.capture.error
+                    if self.last_error:
+                        self.log(self.last_error)
+
+                if frame is not None:
+                    self.last_sequence = sequence
+                    # The system takes over our reference to the frame
+                    await self.rate.process(self.system, frame, sequence)
+                if time.monotonic() - last_report >= self.report_interval:
+                    last_report = time.monotonic()
+                    self.report()
+                await self.rate.wait()
+        finally:
+            self.rate.close()
+            # Joining the capture thread can block on a stalled stream read
+            await asyncio.get_running_loop().run_in_executor(None, self.capture.stop)
+            self.log("Stopped")
+
+
+def start_metrics(config):
+    """Start the /metrics endpoint and/or the periodic JSON dump configured under "metrics"."""
+    server = dumper = None
+    if config.get("port"):
+        server = start_metrics_server(config["port"], config.get("host", "127.0.0.1"))
+        print(f"Serving metrics on http://{server.server_address[0]}:{server.server_address[1]}/metrics",
+              flush=True)
+    if config.get("dump_path"):
+        dumper = MetricsDumper(config["dump_path"], config.get("dump_interval", 15.0))
+        dumper.start()
+        print(f"Writing metrics to {config['dump_path']} every {dumper.interval:g}s", flush=True)
+    return server, dumper
+
+
+async def run_service(config):
+    ensure_data_paths()
+    metrics_server, metrics_dumper = start_metrics(config["metrics"])
+
+    db = AsyncDatabase(**config["database"])
+    if not await db.init_pool():
+        # Attendance is spooled locally and replayed once the database comes back
+        print("Warning: Database connection failed, spooling attendance locally", flush=True)
+
+    loop = asyncio.get_running_loop()
+
+    # Attendance marks from every camera are spooled, INSERTed as attendance_event rows in batches off the
+    # frame loop and folded into attendance_summary
+    attendance_writer = AttendanceWriter(db, **{"spool_path": DEFAULT_SPOOL_PATH, **config["attendance"]}).start()
+
+    # In-process, one gallery index and detector are shared by every camera; with workers each worker
+    # loads its own and this process only needs the gallery's employee IDs
+    face_recognition = None
+    if config["workers"] > 0:
+        identities = gallery_identities(config["gallery"])
+        employee_ids = identities.ids
+        print(f"Gallery has {len(identities.row_identity)} faces of {len(employee_ids)} people", flush=True)
+    else:
+        face_recognition = FaceRecognition(config["gallery"], **config["recognition"])
+        employee_ids = face_recognition.employeeIds
+        print(f"Loaded gallery with {len(face_recognition.gallery or [])} faces of "
+              f"{len(employee_ids)} people ({face_recognition.aggregation})", flush=True)
+
+    # Every gallery identity is loaded up front so recognition causes no per-face SELECTs
+    employee_cache = EmployeeCache(db, **config["employee_cache"])
+    cached = await employee_cache.warm(employee_ids)
+    print(f"Cached {cached} employee records", flush=True)
+
+    # With "workers" > 0 recognition runs in separate processes fed through shared memory
+    # Faces of frames arriving within batching["max_wait"] seconds are encoded and matched in one call
+    worker_pool = None
+    batcher = None
+    if config["workers"] > 0:
+        worker_pool = RecognitionWorkerPool({"encoded_image_path": config["gallery"], **config["recognition"]},
+                                            workers=config["workers"], batching=config["batching"])
+        await loop.run_in_executor(None, worker_pool.start)
+        print(f"Started {config['workers']} recognition worker(s)", flush=True)
+    else:
+        batcher = EncodingBatcher(face_recognition, **config["batching"])
+
+    # Cameras share the event loop (or the workers) and slow down together when it saturates
+    rate_group = RateGroup(capacity=max(1, config["workers"]))
+    workers = [CameraWorker(camera, db, face_recognition, config["process_fps"], worker_pool, attendance_writer,
+                            employee_cache, rate_group, batcher)
+               for camera in config["cameras"]]
+    tasks = [asyncio.create_task(worker.run()) for worker in workers]
+    print(f"Running {len(workers)} camera(s): {', '.join(worker.camera_id for worker in workers)}", flush=True)
+
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows event loops have no signal handlers; Ctrl+C still raises KeyboardInterrupt
+            pass
+
+    # Stop when asked to, or when every source has ended (e.g. non-looping video files)
+    all_done = asyncio.ensure_future(asyncio.gather(*tasks, return_exceptions=True))
+    stop_wait = asyncio.ensure_future(stop.wait())
+    await asyncio.wait([all_done, stop_wait], return_when=asyncio.FIRST_COMPLETED)
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    stop_wait.cancel()
+    for worker in workers:
+        worker.report()
+    if worker_pool is not None:
+        await loop.run_in_executor(None, worker_pool.stop)
+    if batcher is not None:
+        print(f"Encoding batches: {json.dumps(batcher.stats())}", flush=True)
+    await attendance_writer.stop()
+    print(f"Attendance writes: {json.dumps(attendance_writer.stats())}", flush=True)
+    print(f"Employee cache: {json.dumps(employee_cache.stats())}", flush=True)
+    pool_stats = db.pool_stats()
+    print(f"Database pool: {pool_stats['in_use']} in use, {pool_stats['idle']} idle, "
+          f"acquire p95 {pool_stats['acquire_wait']['p95'] * 1000:.1f} ms, "
+          f"query p95 {pool_stats['query_latency']['p95'] * 1000:.1f} ms, "
+          f"{pool_stats['query_timeouts']} timeouts", flush=True)
+    await db.close()
+    print(f"Frame copies: {json.dumps(COPY_STATS.snapshot())}", flush=True)
+    if metrics_dumper is not None:
+        metrics_dumper.stop()
+    if metrics_server is not None:
+        metrics_server.shutdown()
+    print("Service stopped", flush=True)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless multi-camera face recognition attendance service")
+    parser.add_argument('--config', help='Path to a JSON service config (see headless.example.json)')
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    try:
+        sys.exit(asyncio.run(run_service(config)))
+    except KeyboardInterrupt:
+        print("Service stopped", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,12 @@
+from recognition.analyzer import FrameAnalyzer, identify_batch
+from recognition.batcher import EncodingBatcher
+from recognition.detectors import CascadeDetector, HaarCascadeDetector, HOGDetector, MotionSkinFilter, YuNetDetector, create_detector
 from recognition.face_detector import FaceRecognition
-from recognition.system import FaceRecognitionSystem
\ No newline at end of file
+from recognition.gallery_index import BruteForceIndex, IVFIndex, create_index
+from recognition.identities import AGGREGATIONS, IdentityGroups, gallery_identities
+from recognition.matcher import FaceMatcher
+from recognition.motion_gate import MotionGate
+from recognition.roi import RegionOfInterest, detect_in_regions, parse_regions
+from recognition.system import FaceRecognitionSystem
+from recognition.tracker import FaceTracker
+from recognition.workers import RecognitionWorkerPool, SharedFrameRing
\ No newline at end of file
@@ -0,0 +1,75 @@
+from recognition.motion_gate import MotionGate
+from recognition.tracker import FaceTracker
+
+
+class FrameAnalyzer:
+    """CPU stages of the pipeline for one camera: motion gate, detection, tracking and matching.
+
+    Holds no I/O or event-loop state, so it runs the same in-process or inside
+    a recognition worker process.
+    """
+
+    def __init__(self, face_recognition, tracker=None, motion_gate=None, regions=None):
+        self.face_recognition = face_recognition
+        # Detection only scans these regions of interest when given
+        self.regions = regions or []
+        # Encoding and matching only run for new tracks or on the tracker's refresh interval
+        self.tracker = tracker or FaceTracker()
+        # Detection is skipped entirely while the scene is static
+        self.motion_gate = motion_gate or MotionGate()
+
+    def analyze(self, frame, detect_scale=1.0):
+        """Return (tracks, gated); gated frames skip detection and report the current tracks."""
+        tracks, gated, imgSmall, pending = self.detect(frame, detect_scale)
+        if pending:
+            identify_batch(self.face_recognition, [(self, imgSmall, pending)])
+        return tracks, gated
+
+    async def analyze_batched(self, frame, batcher, detect_scale=1.0):
+        """Like analyze, but the pending faces are encoded together with other cameras' by an EncodingBatcher."""
+        tracks, gated, imgSmall, pending = self.detect(frame, detect_scale)
+        if pending:
+            await batcher.identify(self, imgSmall, pending)
+        return tracks, gated
+
+    def detect(self, frame, detect_scale=1.0):
+        """Gate, detect and track; returns (tracks, gated, imgSmall, pending).
+
+        pending are the tracks that are new or due for a refresh and still need
+        encoding and matching (see identify_batch).
+        """
+        if not self.motion_gate.should_process(frame):
+            return list(self.tracker.tracks), True, None, []
+
+        # Detect faces and follow them across frames
+        imgSmall, faceCurFrame = self.face_recognition.detect_faces(frame, detect_scale, self.regions)
+        tracks = self.tracker.update(faceCurFrame)
+        if not tracks or len(self.face_recognition.encodeListKnown) == 0:
+            return tracks, False, imgSmall, []
+        # Encoding and matching only run for tracks that are new or due for a refresh
+        pending = [track for track in tracks if self.tracker.needs_encoding(track)]
+        return tracks, False, imgSmall, pending
+
+    def assign(self, pending, matchIndexes, faceDistances, matches):
+        for track, matchIndex, faceDistance, isMatch in zip(pending, matchIndexes, faceDistances, matches):
+            employee_id = self.face_recognition.employeeIds[matchIndex] if isMatch else None
+            self.tracker.assign_identity(track, employee_id, int(matchIndex), float(faceDistance), bool(isMatch))
+
+
+def identify_batch(face_recognition, jobs):
+    """Encode and match the pending tracks of several frames with one encoder and one matcher call.
+
+    jobs holds (analyzer, imgSmall, pending) triples from FrameAnalyzer.detect,
+    possibly for different cameras sharing face_recognition.
+    """
+    encodings = face_recognition.encode_frames([(imgSmall, [track.box for track in pending])
+                                                for _, imgSmall, pending in jobs])
+    encodeCurFace = [encoding for frameEncodings in encodings for encoding in frameEncodings]
+    # Score every face of the batch against the gallery in one pass
+    matchIndexes, faceDistances, matches = face_recognition.match_faces_batch(encodeCurFace)
+
+    start = 0
+    for (analyzer, _, pending), frameEncodings in zip(jobs, encodings):
+        end = start + len(frameEncodings)
+        analyzer.assign(pending, matchIndexes[start:end], faceDistances[start:end], matches[start:end])
+        start = end
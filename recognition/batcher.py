@@ -0,0 +1,81 @@
+import asyncio
+
+from recognition.analyzer import identify_batch
+from utils.metrics import REGISTRY
+
+
+class EncodingBatcher:
+    """Collects pending faces from several cameras on one event loop and identifies them in one call.
+
+    The first submission opens a batch that is flushed after ``max_wait``
+    seconds, or as soon as it holds ``max_batch`` faces or one frame from every
+    member camera. The whole batch then goes through a single encoder call and a
+    single matcher call (see identify_batch).
+    """
+
+    def __init__(self, face_recognition, max_batch=32, max_wait=0.01):
+        self.face_recognition = face_recognition
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.members = set()
+        self.jobs = []
+        self.futures = []
+        self.faces = 0
+        self.timer = None
+        self.batches = 0
+        self.frames_batched = 0
+        self.faces_batched = 0
+        self.batch_frames = REGISTRY.histogram("encode_batch_frames", "Frames per batched identify call",
+                                               buckets=(1, 2, 4, 8, 16, 32))
+
+    def join(self, analyzer):
+        """Count analyzer's camera as a member, so a batch holding all members flushes without waiting."""
+        self.members.add(id(analyzer))
+
+    def leave(self, analyzer):
+        self.members.discard(id(analyzer))
+
+    async def identify(self, analyzer, imgSmall, pending):
+        """Queue a frame's pending tracks and wait until its batch has been encoded and matched."""
+        future = asyncio.get_running_loop().create_future()
+        self.jobs.append((analyzer, imgSmall, pending))
+        self.futures.append(future)
+        self.faces += len(pending)
+
+        submitted = {id(job[0]) for job in self.jobs}
+        if self.faces >= self.max_batch or (self.members and self.members <= submitted):
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.max_wait, self.flush)
+        await future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        jobs, futures = self.jobs, self.futures
+        self.jobs, self.futures, self.faces = [], [], 0
+        if not jobs:
+            return
+
+        self.batches += 1
+        self.frames_batched += len(jobs)
+        self.faces_batched += sum(len(pending) for _, _, pending in jobs)
+        self.batch_frames.observe(len(jobs))
+        try:
+            identify_batch(self.face_recognition, jobs)
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future in futures:
+            if not future.done():
+                future.set_result(None)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "frames_per_batch": self.frames_batched / self.batches if self.batches else 0.0,
+            "faces_per_batch": self.faces_batched / self.batches if self.batches else 0.0,
+        }
@@ -0,0 +1,279 @@
+import argparse
+import json
+import os
+import time
+import cv2
+import face_recognition
+import numpy as np
+
+from recognition.tracker import box_iou
+
+# Boxes are (top, right, bottom, left) in full-frame pixel coordinates, like face_recognition.
+
+
+def _downscale(frame, scale):
+    if scale == 1.0:
+        return frame
+    return cv2.resize(frame, (0, 0), None, scale, scale)
+
+
+def _to_full_frame(boxes, scale, offset=(0, 0)):
+    dy, dx = offset
+    return [(int(top / scale) + dy, int(right / scale) + dx, int(bottom / scale) + dy, int(left / scale) + dx)
+            for (top, right, bottom, left) in boxes]
+
+
+def _rects_to_boxes(rects):
+    return [(int(y), int(x + w), int(y + h), int(x)) for (x, y, w, h) in rects]
+
+
+class HOGDetector:
+    """dlib HOG (or CNN) detector through face_recognition.face_locations."""
+    name = "hog"
+
+    def __init__(self, scale=0.25, number_of_times_to_upsample=1, model="hog"):
+        self.scale = scale
+        self.number_of_times_to_upsample = number_of_times_to_upsample
+        self.model = model
+
+    def detect(self, frame):
+        small = cv2.cvtColor(_downscale(frame, self.scale), cv2.COLOR_BGR2RGB)
+        boxes = face_recognition.face_locations(small, self.number_of_times_to_upsample, self.model)
+        return _to_full_frame(boxes, self.scale)
+
+
+class HaarCascadeDetector:
+    """OpenCV Haar or LBP cascade; pass an LBP XML file as cascade_path to use LBP features."""
+    name = "haar"
+
+    def __init__(self, scale=0.5, cascade_path=None, scale_factor=1.1, min_neighbors=5, min_size=24):
+        self.scale = scale
+        self.cascade_path = cascade_path or os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        if not hasattr(cv2, "CascadeClassifier"):
+            raise ValueError("This OpenCV build has no CascadeClassifier")
+        self.cascade = cv2.CascadeClassifier(self.cascade_path)
+        if self.cascade.empty():
+            raise ValueError(f"Could not load cascade: {self.cascade_path}")
+
+    def detect(self, frame):
+        gray = cv2.cvtColor(_downscale(frame, self.scale), cv2.COLOR_BGR2GRAY)
+        rects = self.cascade.detectMultiScale(gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+                                              minSize=(self.min_size, self.min_size))
+        return _to_full_frame(_rects_to_boxes(rects), self.scale)
+
+
+class YuNetDetector:
+    """OpenCV DNN FaceDetectorYN with a local ONNX model file."""
+    name = "yunet"
+
+    def __init__(self, scale=0.5, model_path="resources/face_detection_yunet_2023mar.onnx",
+                 score_threshold=0.9, nms_threshold=0.3, top_k=5000):
+        if not os.path.exists(model_path):
+            raise ValueError(f"YuNet model file not found: {model_path}")
+        self.scale = scale
+        self.model_path = model_path
+        self.detector = cv2.FaceDetectorYN.create(model_path, "", (320, 320), score_threshold, nms_threshold, top_k)
+
+    def detect(self, frame):
+        small = _downscale(frame, self.scale)
+        height, width = small.shape[:2]
+        self.detector.setInputSize((width, height))
+        _, faces = self.detector.detect(small)
+        if faces is None:
+            return []
+        return _to_full_frame(_rects_to_boxes(faces[:, :4]), self.scale)
+
+
+class MotionSkinFilter:
+    """Cheap pre-filter returning regions with skin-coloured pixels that changed since the last frame.
+
+    Its boxes are candidate regions, not faces; use it as the first stage of a CascadeDetector.
+    """
+    name = "motion_skin"
+
+    def __init__(self, scale=0.25, motion=True, skin=True, motion_threshold=25, min_area_ratio=0.002):
+        self.scale = scale
+        self.motion = motion
+        self.skin = skin
+        self.motion_threshold = motion_threshold
+        self.min_area_ratio = min_area_ratio
+        self.previous = None
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+
+    def detect(self, frame):
+        small = _downscale(frame, self.scale)
+        mask = np.full(small.shape[:2], 255, dtype=np.uint8)
+
+        if self.motion:
+            gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+            previous, self.previous = self.previous, gray
+            # Without history (first frame, size change) every pixel counts as moving
+            if previous is not None and previous.shape == gray.shape:
+                _, moving = cv2.threshold(cv2.absdiff(gray, previous), self.motion_threshold, 255, cv2.THRESH_BINARY)
+                mask = cv2.bitwise_and(mask, cv2.dilate(moving, self.kernel, iterations=3))
+
+        if self.skin:
+            ycrcb = cv2.cvtColor(small, cv2.COLOR_BGR2YCrCb)
+            skin = cv2.inRange(ycrcb, (0, 133, 77), (255, 173, 127))
+            mask = cv2.bitwise_and(mask, cv2.morphologyEx(skin, cv2.MORPH_OPEN, self.kernel))
+
+        min_area = self.min_area_ratio * mask.shape[0] * mask.shape[1]
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        rects = [cv2.boundingRect(contour) for contour in contours if cv2.contourArea(contour) >= min_area]
+        return _to_full_frame(_rects_to_boxes(rects), self.scale)
+
+
+def _merge_regions(boxes, padding, height, width):
+    """Pad candidate boxes, clip them to the frame and merge overlapping ones."""
+    regions = []
+    for (top, right, bottom, left) in boxes:
+        pad_y, pad_x = int((bottom - top) * padding), int((right - left) * padding)
+        regions.append([max(0, top - pad_y), min(width, right + pad_x), min(height, bottom + pad_y), max(0, left - pad_x)])
+
+    merged = True
+    while merged and len(regions) > 1:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] < b[2] and b[0] < a[2] and a[3] < b[1] and b[3] < a[1]:
+                    regions[i] = [min(a[0], b[0]), max(a[1], b[1]), max(a[2], b[2]), min(a[3], b[3])]
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(region) for region in regions]
+
+
+class CascadeDetector:
+    """Chain of detectors where each stage only scans the padded regions found by the previous one.
+
+    An empty result from any stage short-circuits the rest, so a cheap first
+    stage keeps the expensive detector off static or empty frames.
+    """
+    name = "cascade"
+
+    def __init__(self, stages, padding=0.5):
+        if not stages:
+            raise ValueError("A detector cascade needs at least one stage")
+        self.stages = stages
+        self.padding = padding
+
+    def detect(self, frame):
+        height, width = frame.shape[:2]
+        boxes = self.stages[0].detect(frame)
+        for stage in self.stages[1:]:
+            if not boxes:
+                return []
+            found = []
+            for (top, right, bottom, left) in _merge_regions(boxes, self.padding, height, width):
+                crop = frame[top:bottom, left:right]
+                if crop.size == 0:
+                    continue
+                found.extend(_to_full_frame(stage.detect(crop), 1.0, (top, left)))
+            boxes = found
+        return boxes
+
+
+DETECTOR_BACKENDS = {
+    HOGDetector.name: HOGDetector,
+    HaarCascadeDetector.name: HaarCascadeDetector,
+    YuNetDetector.name: YuNetDetector,
+    MotionSkinFilter.name: MotionSkinFilter,
+    CascadeDetector.name: CascadeDetector,
+}
+
+
+def create_detector(config=None):
+    """Build a detector from a config dict such as {"type": "hog", "scale": 0.25}.
+
+    Cascades list their stages: {"type": "cascade", "stages": [{"type": "haar"}, {"type": "hog"}]}.
+    """
+    config = dict(config or {"type": HOGDetector.name})
+    backend = config.pop("type", HOGDetector.name)
+    if backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown detector backend: {backend} (choose from {', '.join(DETECTOR_BACKENDS)})")
+    if backend == CascadeDetector.name:
+        config["stages"] = [create_detector(stage) for stage in config.get("stages", [])]
+    return DETECTOR_BACKENDS[backend](**config)
+
+
+def benchmark_detectors(configs, image_paths, labels=None, reference=None, iou_threshold=0.5, repeat=1):
+    """Report images/sec, faces/sec and recall for each detector config on a fixed image set.
+
+    Recall is measured against ``labels`` ({filename: [[top, right, bottom, left], ...]}) when
+    given, otherwise against the boxes found by the ``reference`` detector config.
+    """
+    images = [(os.path.basename(path), cv2.imread(path)) for path in image_paths]
+    images = [(name, img) for name, img in images if img is not None]
+
+    if labels is None:
+        reference_detector = create_detector(reference or {"type": "hog", "scale": 1.0})
+        labels = {name: reference_detector.detect(img) for name, img in images}
+
+    rows = []
+    for config in configs:
+        detector = create_detector(config)
+        found_faces = 0
+        true_positives = 0
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for name, img in images:
+                boxes = detector.detect(img)
+                found_faces += len(boxes)
+                truth = labels.get(name, [])
+                if truth and boxes:
+                    true_positives += int(np.sum(box_iou(truth, boxes).max(axis=1) >= iou_threshold))
+        elapsed = time.perf_counter() - start
+        total_truth = sum(len(labels.get(name, [])) for name, _ in images) * repeat
+        rows.append({
+            "config": config,
+            "images_per_sec": len(images) * repeat / elapsed if elapsed else 0.0,
+            "faces_per_sec": found_faces / elapsed if elapsed else 0.0,
+            "recall": true_positives / total_truth if total_truth else None,
+        })
+
+    print(f"Detector benchmark on {len(images)} images")
+    print(f"{'img/s':>8}{'faces/s':>9}{'recall':>8}  config")
+    for row in rows:
+        recall = "-" if row["recall"] is None else f"{row['recall']:.3f}"
+        print(f"{row['images_per_sec']:>8.1f}{row['faces_per_sec']:>9.1f}{recall:>8}  {json.dumps(row['config'])}")
+    return rows
+
+
+DEFAULT_BENCHMARK_CONFIGS = [
+    {"type": "hog", "scale": 0.25},
+    {"type": "hog", "scale": 0.5},
+    {"type": "haar", "scale": 0.5},
+    {"type": "cascade", "stages": [{"type": "haar", "scale": 0.5}, {"type": "hog", "scale": 0.5}]},
+    {"type": "cascade", "stages": [{"type": "motion_skin", "motion": False}, {"type": "hog", "scale": 0.5}]},
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark face detector configurations on an image folder")
+    parser.add_argument('--images', default='Images', help='Folder of test images')
+    parser.add_argument('--labels', help='JSON file of ground-truth boxes per image filename')
+    parser.add_argument('--configs', help='JSON file with a list of detector configs to compare')
+    parser.add_argument('--repeat', type=int, default=1, help='Passes over the image set per config')
+    args = parser.parse_args()
+
+    configs = DEFAULT_BENCHMARK_CONFIGS
+    if args.configs:
+        with open(args.configs, 'r') as f:
+            configs = json.load(f)
+    labels = None
+    if args.labels:
+        with open(args.labels, 'r') as f:
+            labels = json.load(f)
+
+    image_paths = [os.path.join(args.images, name) for name in sorted(os.listdir(args.images))]
+    benchmark_detectors(configs, image_paths, labels, repeat=args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,177 @@
 import os
-import pickle
 import cv2
 import face_recognition
 import numpy as np
 
+from recognition.detectors import _downscale, _to_full_frame, create_detector
+from recognition.gallery_file import load_gallery
+from recognition.gallery_index import create_index
+from recognition.identities import AGGREGATIONS, IdentityGroups
+from recognition.roi import detect_in_regions
+from utils.metrics import REGISTRY
+
+try:
+    # face_recognition's own dlib models, used directly to align and encode faces in batches
+    import dlib
+    from face_recognition.api import face_encoder as FACE_ENCODER, pose_predictor_5_point as POSE_PREDICTOR
+except ImportError:
+    dlib = None
+
+# Aligned face chips fed to dlib's network; face_recognition.face_encodings uses the same size and padding
+CHIP_SIZE = 150
+CHIP_PADDING = 0.25
+
+STAGE_HELP = "Seconds spent per FaceRecognition stage"
+DETECT_TIME = REGISTRY.histogram("recognition_stage_seconds", STAGE_HELP, stage="detect")
+RESIZE_TIME = REGISTRY.histogram("recognition_stage_seconds", STAGE_HELP, stage="resize")
+ENCODE_TIME = REGISTRY.histogram("recognition_stage_seconds", STAGE_HELP, stage="encode")
+MATCH_TIME = REGISTRY.histogram("recognition_stage_seconds", STAGE_HELP, stage="match")
+FACES_DETECTED = REGISTRY.counter("faces_detected_total", "Face boxes returned by the detector")
+FACES_ENCODED = REGISTRY.counter("faces_encoded_total", "Faces passed to the encoder")
+FACES_MATCHED = REGISTRY.counter("faces_matched_total", "Face encodings scored against the gallery")
+ENCODE_BATCH = REGISTRY.histogram("encode_batch_faces", "Faces per encoder call",
+                                  buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+
 
 class FaceRecognition:
-    def __init__(self, encoded_image_path):
-        if os.path.exists(encoded_image_path):
-            with open(encoded_image_path, "rb") as file:
-                self.encodeListKnownWithIds = pickle.load(file)
-                self.encodeListKnown, self.employeeIds = self.encodeListKnownWithIds
+    def __init__(self, encoded_image_path, tolerance=0.6, index_backend="brute_force", index_options=None,
+                 detector=None, encode_scale=0.25, aggregation="nearest", top_k=3):
+        self.encoded_image_path = encoded_image_path
+        # A person may have several gallery rows; aggregation decides how their scores combine
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation: {aggregation} (choose from {', '.join(AGGREGATIONS)})")
+        if aggregation == "top_k_mean" and index_backend != "brute_force":
+            raise ValueError("top_k_mean aggregation needs every member distance, use the brute_force index")
+        self.aggregation = aggregation
+        self.top_k = top_k
+        self.tolerance = tolerance
+        # Detection is pluggable; encoding runs on a frame downscaled by encode_scale
+        self.detector = create_detector(detector)
+        self.encode_scale = encode_scale
+        self.index = create_index(index_backend, tolerance=tolerance, **(index_options or {}))
+        self.refresh()
+
+    def refresh(self):
+        """(Re)load the encodings written by EncodeGenerator.py and rebuild the gallery index."""
+        if os.path.exists(self.encoded_image_path):
+            # Binary galleries are memory-mapped, legacy pickles are still accepted
+            self.gallery = load_gallery(self.encoded_image_path)
+            encodeListKnown, sqNorms, rowIds = self.gallery.embeddings, self.gallery.sq_norms, self.gallery.ids
+        else:
+            self.gallery = None
+            encodeListKnown, sqNorms, rowIds = [], None, []
+            print(f"Warning: Encoded image file not found: {self.encoded_image_path}")
+
+        # Match indexes returned by match_faces* point into employeeIds, one entry per person
+        self.identities = IdentityGroups(rowIds)
+        self.employeeIds = self.identities.ids
+
+        # The index keeps the gallery as one contiguous (N, 128) float32 matrix
+        if self.aggregation == "centroid":
+            self.index.build(self.identities.centroids(encodeListKnown))
         else:
-            self.encodeListKnown = []
-            self.employeeIds = []
-            print(f"Warning: Encoded image file not found: {encoded_image_path}")
+            self.index.build(encodeListKnown, sqNorms)
+        self.encodeListKnown = self.index.gallery
+
+    def detect_faces(self, frame, detect_scale=1.0, regions=None):
+        """Return the downscaled RGB frame used for encoding and the full-frame face boxes.
+
+        detect_scale < 1 shrinks the frame before detection on top of the detector's own scale,
+        trading small faces for speed under load. With regions (RegionOfInterest list) only
+        those parts of the frame are scanned.
+        """
+        with DETECT_TIME.time():
+            if regions:
+                faceCurFrame = detect_in_regions(self.detector, frame, regions, detect_scale)
+            elif detect_scale < 1.0:
+                faceCurFrame = _to_full_frame(self.detector.detect(_downscale(frame, detect_scale)), detect_scale)
+            else:
+                faceCurFrame = self.detector.detect(frame)
+        FACES_DETECTED.inc(len(faceCurFrame))
+        with RESIZE_TIME.time():
+            imgSmall = cv2.resize(frame, (0, 0), None, self.encode_scale, self.encode_scale)
+            imgSmall = cv2.cvtColor(imgSmall, cv2.COLOR_BGR2RGB)
+        return imgSmall, faceCurFrame
+
+    def encode_faces(self, imgSmall, faceLocations):
+        """Compute 128-d encodings for full-frame boxes of a frame returned by detect_faces."""
+        return self.encode_frames([(imgSmall, faceLocations)])[0]
+
+    def encode_frames(self, frames):
+        """Encode the faces of several frames in one encoder call; returns one list of encodings per frame.
+
+        frames holds (imgSmall, faceLocations) pairs from detect_faces, possibly from different
+        cameras. Every face is aligned to a chip from its 5-point landmarks and all chips go
+        through dlib's network as a single batch.
+        """
+        scale = self.encode_scale
+        frames = [(imgSmall, [(int(top * scale), int(right * scale), int(bottom * scale), int(left * scale))
+                              for (top, right, bottom, left) in faceLocations])
+                  for imgSmall, faceLocations in frames]
+        counts = [len(smallLocations) for _, smallLocations in frames]
+        if sum(counts) == 0:
+            return [[] for _ in frames]
+        FACES_ENCODED.inc(sum(counts))
+        ENCODE_BATCH.observe(sum(counts))
+        with ENCODE_TIME.time():
+            if dlib is None:
+                encodings = [encoding for imgSmall, smallLocations in frames if smallLocations
+                             for encoding in face_recognition.face_encodings(imgSmall, smallLocations)]
+            else:
+                chips = []
+                for imgSmall, smallLocations in frames:
+                    if not smallLocations:
+                        continue
+                    shapes = dlib.full_object_detections()
+                    for top, right, bottom, left in smallLocations:
+                        shapes.append(POSE_PREDICTOR(imgSmall, dlib.rectangle(left, top, right, bottom)))
+                    chips.extend(dlib.get_face_chips(imgSmall, shapes, size=CHIP_SIZE, padding=CHIP_PADDING))
+                encodings = [np.array(descriptor) for descriptor in FACE_ENCODER.compute_face_descriptor(chips)]
+
+        # Split the flat batch back into per-frame lists
+        offsets = np.cumsum([0] + counts)
+        return [encodings[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
 
     def recognize_faces(self, frame):
-        imgSmall = cv2.resize(frame, (0, 0), None, 0.25, 0.25)
-        imgSmall = cv2.cvtColor(imgSmall, cv2.COLOR_BGR2RGB)
-        faceCurFrame = face_recognition.face_locations(imgSmall)
+        imgSmall, faceCurFrame = self.detect_faces(frame)
 
         # Return empty lists if no faces are detected
         if not faceCurFrame:
             return [], []
 
         try:
-            encodeCurFace = face_recognition.face_encodings(imgSmall, faceCurFrame)
-            faceCurFrame = [(int(top), int(right), int(bottom), int(left)) for (top, right, bottom, left) in faceCurFrame]
+            encodeCurFace = self.encode_faces(imgSmall, faceCurFrame)
             return faceCurFrame, encodeCurFace
         except Exception as e:
             print(f"Error in face encoding: {str(e)}")
             return [], []
 
     def match_faces(self, encodeFace):
-        if not self.encodeListKnown:
-            return [], 0
+        """Return (matchIndex, distance, is_match) for one face encoding."""
+        matchIndexes, faceDistances, matches = self.match_faces_batch([encodeFace])
+        return int(matchIndexes[0]), float(faceDistances[0]), bool(matches[0])
+
+    def match_faces_batch(self, encodeCurFace):
+        """Return arrays of (matchIndex, distance, is_match) for every face in a frame.
+
+        matchIndex is a position in employeeIds. Every aggregation scores the
+        whole block in one pass over the flattened gallery matrix.
+        """
+        queries = np.asarray(encodeCurFace)
+        FACES_MATCHED.inc(len(queries))
+        with MATCH_TIME.time():
+            return self._match_batch(queries)
 
-        matches = face_recognition.compare_faces(self.encodeListKnown, encodeFace)
-        faceDis = face_recognition.face_distance(self.encodeListKnown, encodeFace)
+    def _match_batch(self, queries):
+        if self.aggregation == "top_k_mean" and len(self.identities) > 0 and len(queries) > 0:
+            distances = np.sqrt(self.index.matcher.squared_distances(queries))
+            scores = self.identities.top_k_mean(distances, self.top_k)
+            matchIndexes = np.argmin(scores, axis=1)
+            faceDistances = scores[np.arange(len(scores)), matchIndexes]
+            return matchIndexes, faceDistances, faceDistances <= self.tolerance
 
-        if len(faceDis) > 0:
-            matchIndex = np.argmin(faceDis)
-            return matches, matchIndex
-        return [], 0
\ No newline at end of file
+        matchIndexes, faceDistances, matches = self.index.search_batch(queries)
+        if self.aggregation != "centroid":
+            # Rows of the same person collapse to that person's nearest member
+            matchIndexes = self.identities.identity_of(matchIndexes)
+        return matchIndexes, faceDistances, matches
@@ -0,0 +1,157 @@
+import os
+import pickle
+import struct
+import numpy as np
+
+# Binary gallery layout (little endian):
+#   [0, 128)         header, see HEADER_FORMAT
+#   embeddings_off   float32 (count, dim) embedding matrix, C order
+#   norms_off        float32 (count,) squared L2 norm of every row
+#   ids_off          fixed-width UTF-8 ID table, (count,) of S<id_width>
+# Every block starts on a 64-byte boundary so np.memmap views stay aligned.
+GALLERY_MAGIC = b"FRGALLRY"
+GALLERY_VERSION = 1
+DEFAULT_MODEL_NAME = "dlib_resnet_v1"
+HEADER_FORMAT = "<8sHHIQIIQQQ64s8x"
+HEADER_SIZE = 128
+MODEL_NAME_SIZE = 64
+BLOCK_ALIGN = 64
+
+assert struct.calcsize(HEADER_FORMAT) == HEADER_SIZE
+
+
+def _align(offset):
+    return (offset + BLOCK_ALIGN - 1) // BLOCK_ALIGN * BLOCK_ALIGN
+
+
+class IdTable:
+    """Read-only sequence of employee IDs decoded lazily from a fixed-width byte array."""
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def __len__(self):
+        return len(self.raw)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [value.decode("utf-8") for value in self.raw[index]]
+        return self.raw[index].decode("utf-8")
+
+    def __iter__(self):
+        for value in self.raw:
+            yield value.decode("utf-8")
+
+    def tolist(self):
+        return list(self)
+
+
+class Gallery:
+    """Embedding matrix, per-row squared norms and ID table of an encoded gallery."""
+
+    def __init__(self, embeddings, ids, sq_norms=None, model_name=DEFAULT_MODEL_NAME, version=GALLERY_VERSION):
+        self.embeddings = embeddings
+        self.ids = ids
+        self.sq_norms = sq_norms
+        self.model_name = model_name
+        self.version = version
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dim(self):
+        return self.embeddings.shape[1]
+
+
+def write_gallery(path, encodings, ids, model_name=DEFAULT_MODEL_NAME):
+    """Write a gallery file atomically so running readers keep their old mapping."""
+    if len(encodings) != len(ids):
+        raise ValueError(f"Gallery has {len(encodings)} encodings but {len(ids)} IDs")
+
+    embeddings = np.ascontiguousarray(encodings, dtype=np.float32).reshape(len(ids), -1) if len(ids) else \
+        np.empty((0, 128), dtype=np.float32)
+    sq_norms = np.einsum("ij,ij->i", embeddings, embeddings).astype(np.float32)
+    encoded_ids = [str(employee_id).encode("utf-8") for employee_id in ids]
+    id_width = max((len(value) for value in encoded_ids), default=1) or 1
+    id_table = np.array(encoded_ids, dtype=f"S{id_width}")
+
+    count, dim = embeddings.shape
+    embeddings_offset = _align(HEADER_SIZE)
+    norms_offset = _align(embeddings_offset + embeddings.nbytes)
+    ids_offset = _align(norms_offset + sq_norms.nbytes)
+    model = model_name.encode("utf-8")
+    if len(model) > MODEL_NAME_SIZE:
+        raise ValueError(f"Model name longer than {MODEL_NAME_SIZE} bytes: {model_name}")
+    header = struct.pack(HEADER_FORMAT, GALLERY_MAGIC, GALLERY_VERSION, HEADER_SIZE, dim, count, id_width, 0,
+                         embeddings_offset, norms_offset, ids_offset, model)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(header)
+        for offset, block in ((embeddings_offset, embeddings), (norms_offset, sq_norms), (ids_offset, id_table)):
+            file.write(b"\0" * (offset - file.tell()))
+            file.write(block.tobytes())
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_gallery_header(path):
+    """Return the header fields of a gallery file, or None if it is not one."""
+    with open(path, "rb") as file:
+        raw = file.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE or not raw.startswith(GALLERY_MAGIC):
+        return None
+    (_, version, header_size, dim, count, id_width, _,
+     embeddings_offset, norms_offset, ids_offset, model) = struct.unpack(HEADER_FORMAT, raw)
+    return {
+        "version": version,
+        "header_size": header_size,
+        "dim": dim,
+        "count": count,
+        "id_width": id_width,
+        "embeddings_offset": embeddings_offset,
+        "norms_offset": norms_offset,
+        "ids_offset": ids_offset,
+        "model_name": model.rstrip(b"\0").decode("utf-8"),
+    }
+
+
+def load_gallery(path):
+    """Memory-map a gallery file; legacy EncodedImages.pickle files are read in full."""
+    header = read_gallery_header(path)
+    if header is None:
+        return load_pickle_gallery(path)
+    if header["version"] > GALLERY_VERSION:
+        raise ValueError(f"Gallery {path} has version {header['version']}, newer than supported {GALLERY_VERSION}")
+
+    count, dim, model_name = header["count"], header["dim"], header["model_name"]
+    if count == 0:
+        return Gallery(np.empty((0, dim), dtype=np.float32), [], np.empty(0, dtype=np.float32), model_name)
+
+    # Read-only shared mappings: every recognizer process on the host uses the same page cache
+    embeddings = np.memmap(path, dtype=np.float32, mode="r", offset=header["embeddings_offset"], shape=(count, dim))
+    sq_norms = np.memmap(path, dtype=np.float32, mode="r", offset=header["norms_offset"], shape=(count,))
+    raw_ids = np.memmap(path, dtype=f"S{header['id_width']}", mode="r", offset=header["ids_offset"], shape=(count,))
+    return Gallery(embeddings, IdTable(raw_ids), sq_norms, model_name, header["version"])
+
+
+def load_pickle_gallery(path):
+    """Read the legacy ``[list_of_encodings, ids]`` pickle written by older EncodeGenerator versions."""
+    with open(path, "rb") as file:
+        encodings, ids = pickle.load(file)
+    if len(encodings) != len(ids):
+        # Older encoders skipped faceless images without dropping their IDs, so rows and IDs are misaligned
+        raise ValueError(f"{path} has {len(encodings)} encodings but {len(ids)} IDs and cannot be used, "
+                         f"re-run EncodeGenerator.py")
+    embeddings = np.ascontiguousarray(encodings, dtype=np.float32).reshape(len(ids), -1) if len(ids) else \
+        np.empty((0, 128), dtype=np.float32)
+    return Gallery(embeddings, list(ids), version=0)
+
+
+def migrate_pickle(pickle_path, gallery_path, model_name=DEFAULT_MODEL_NAME):
+    """Convert a legacy pickle into the binary gallery format."""
+    legacy = load_pickle_gallery(pickle_path)
+    write_gallery(gallery_path, legacy.embeddings, legacy.ids, model_name)
+    return gallery_path
@@ -0,0 +1,198 @@
+import argparse
+import time
+import numpy as np
+
+from recognition.gallery_file import load_gallery
+from recognition.matcher import FaceMatcher
+
+
+class BruteForceIndex:
+    """Exact index: one GEMM against the whole gallery per query block."""
+    name = "brute_force"
+
+    def __init__(self, tolerance=0.6):
+        self.matcher = FaceMatcher([], tolerance=tolerance)
+
+    @property
+    def gallery(self):
+        return self.matcher.gallery
+
+    def __len__(self):
+        return len(self.matcher)
+
+    def build(self, encodings, sq_norms=None):
+        self.matcher.set_gallery(encodings, sq_norms)
+        return self
+
+    def search_batch(self, queries):
+        """Return (indices, distances, matches) arrays for an (M, 128) query block."""
+        return self.matcher.match_batch(queries)
+
+
+class IVFIndex:
+    """Approximate inverted-file index over k-means partitions of the gallery.
+
+    The gallery is clustered into ``n_lists`` cells and stored grouped by cell.
+    A query is scored against the cell centroids and then scanned exhaustively
+    inside its ``n_probe`` nearest cells only.
+    """
+    name = "ivf"
+
+    def __init__(self, tolerance=0.6, n_lists=None, n_probe=8, n_iter=10, train_size=256, seed=0):
+        self.tolerance = tolerance
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.train_size = train_size
+        self.seed = seed
+        self.build([])
+
+    def __len__(self):
+        return self.gallery.shape[0]
+
+    def build(self, encodings, sq_norms=None):
+        """Cluster the gallery and lay rows out contiguously per cell."""
+        self.gallery = FaceMatcher(encodings, sq_norms=sq_norms).gallery
+        count = len(self.gallery)
+        if count == 0:
+            self.centroids = np.empty((0, self.gallery.shape[1]), dtype=np.float32)
+            self.order = np.empty(0, dtype=np.intp)
+            self.list_offsets = np.zeros(1, dtype=np.intp)
+            self.cells = FaceMatcher([])
+            return self
+
+        n_lists = self.n_lists or max(1, int(np.sqrt(count)))
+        n_lists = min(n_lists, count)
+        self.centroids = self._kmeans(self.gallery, n_lists)
+        labels = self._assign(self.gallery, self.centroids)
+
+        self.order = np.argsort(labels, kind="stable")
+        self.list_offsets = np.searchsorted(labels[self.order], np.arange(n_lists + 1))
+        self.cells = FaceMatcher(self.gallery[self.order])
+        return self
+
+    def _assign(self, data, centroids, chunk=65536):
+        labels = np.empty(len(data), dtype=np.intp)
+        assigner = FaceMatcher(centroids)
+        for start in range(0, len(data), chunk):
+            labels[start:start + chunk] = np.argmin(assigner.squared_distances(data[start:start + chunk]), axis=1)
+        return labels
+
+    def _kmeans(self, data, n_lists):
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(data), n_lists * self.train_size)
+        sample = data[rng.choice(len(data), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+        for _ in range(self.n_iter):
+            labels = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=n_lists)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, np.newaxis]
+            # Re-seed empty cells from random sample points
+            empty = np.flatnonzero(~filled)
+            if len(empty):
+                centroids[empty] = sample[rng.choice(sample_size, len(empty), replace=False)]
+        return centroids
+
+    def search_batch(self, queries):
+        """Return (indices, distances, matches) arrays for an (M, 128) query block."""
+        queries = np.ascontiguousarray(queries, dtype=np.float32).reshape(-1, self.gallery.shape[1])
+        count = len(queries)
+        indices = np.full(count, -1, dtype=np.intp)
+        distances = np.full(count, np.inf, dtype=np.float32)
+        if count == 0 or len(self) == 0:
+            return indices, distances, np.zeros(count, dtype=bool)
+
+        n_probe = min(self.n_probe, len(self.centroids))
+        centroid_dist = FaceMatcher(self.centroids).squared_distances(queries)
+        probes = np.argpartition(centroid_dist, n_probe - 1, axis=1)[:, :n_probe]
+
+        cells = self.cells
+        for qi in range(count):
+            rows = np.concatenate([np.arange(self.list_offsets[c], self.list_offsets[c + 1]) for c in probes[qi]])
+            if len(rows) == 0:
+                continue
+            query = queries[qi]
+            dist_sq = cells.gallery_sq_norms[rows] - 2.0 * (cells.gallery[rows] @ query) + query @ query
+            best = np.argmin(dist_sq)
+            indices[qi] = self.order[rows[best]]
+            distances[qi] = np.sqrt(max(dist_sq[best], 0.0))
+
+        return indices, distances, distances <= self.tolerance
+
+
+INDEX_BACKENDS = {
+    BruteForceIndex.name: BruteForceIndex,
+    IVFIndex.name: IVFIndex,
+}
+
+
+def create_index(backend="brute_force", **options):
+    """Instantiate a gallery index backend by name."""
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown gallery index backend: {backend} (choose from {', '.join(INDEX_BACKENDS)})")
+    return INDEX_BACKENDS[backend](**options)
+
+
+def recall_latency_report(encodings, n_queries=500, noise=0.03, n_probe_values=(1, 2, 4, 8, 16, 32), seed=0, **ivf_options):
+    """Compare IVF recall@1 and per-query latency against the exact backend."""
+    rng = np.random.default_rng(seed)
+    gallery = FaceMatcher(encodings).gallery
+    picks = rng.choice(len(gallery), min(n_queries, len(gallery)), replace=False)
+    queries = gallery[picks] + rng.normal(0.0, noise, size=(len(picks), gallery.shape[1])).astype(np.float32)
+
+    def timed(index):
+        start = time.perf_counter()
+        for query in queries:
+            index.search_batch(query[np.newaxis, :])
+        per_query = (time.perf_counter() - start) / len(queries)
+        return index.search_batch(queries)[0], per_query
+
+    exact = BruteForceIndex().build(gallery)
+    exact_indices, exact_latency = timed(exact)
+    rows = [{"backend": "brute_force", "n_probe": None, "recall": 1.0, "latency_ms": exact_latency * 1000}]
+
+    start = time.perf_counter()
+    ivf = IVFIndex(**ivf_options).build(gallery)
+    build_seconds = time.perf_counter() - start
+    for n_probe in n_probe_values:
+        ivf.n_probe = n_probe
+        ivf_indices, ivf_latency = timed(ivf)
+        rows.append({
+            "backend": "ivf",
+            "n_probe": n_probe,
+            "recall": float(np.mean(ivf_indices == exact_indices)),
+            "latency_ms": ivf_latency * 1000,
+        })
+
+    print(f"Gallery: {len(gallery)} embeddings, {len(queries)} queries, "
+          f"{len(ivf.centroids)} IVF lists built in {build_seconds:.2f}s")
+    print(f"{'backend':<12}{'n_probe':>8}{'recall@1':>10}{'ms/query':>10}")
+    for row in rows:
+        n_probe = "-" if row["n_probe"] is None else row["n_probe"]
+        print(f"{row['backend']:<12}{n_probe:>8}{row['recall']:>10.3f}{row['latency_ms']:>10.3f}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs latency report for the gallery index backends")
+    parser.add_argument('--gallery', default="data/EncodedImages.gallery", help='Encoded gallery produced by EncodeGenerator.py')
+    parser.add_argument('--synthetic', type=int, default=0, help='Use N random unit-scale embeddings instead of the gallery file')
+    parser.add_argument('--queries', type=int, default=500, help='Number of perturbed gallery rows to query with')
+    parser.add_argument('--n-lists', type=int, default=None, help='IVF cell count (default sqrt(N))')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        encodings = rng.normal(0.0, 0.1, size=(args.synthetic, 128)).astype(np.float32)
+    else:
+        encodings = load_gallery(args.gallery).embeddings
+
+    recall_latency_report(encodings, n_queries=args.queries, n_lists=args.n_lists)
+
+
+if __name__ == "__main__":
+    main()
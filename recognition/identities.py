@@ -0,0 +1,88 @@
+import os
+import numpy as np
+
+from recognition.gallery_file import IdTable, load_gallery
+
+AGGREGATIONS = ("nearest", "centroid", "top_k_mean")
+
+
+class IdentityGroups:
+    """Gallery rows grouped by employee ID, for per-identity reduction of row scores.
+
+    A gallery may hold several embeddings per person. Identities are numbered
+    in sorted ID order; ``row_identity`` maps every gallery row to its identity
+    and ``members`` is an (identities, max_members) table of row numbers padded
+    with -1, so reductions over the flattened distance matrix stay vectorized.
+    """
+
+    def __init__(self, ids):
+        if isinstance(ids, IdTable):
+            keys = np.asarray(ids.raw)
+        else:
+            keys = np.array([str(employee_id) for employee_id in ids], dtype=object)
+        if len(keys) == 0:
+            self.ids = []
+            self.row_identity = np.empty(0, dtype=np.intp)
+            self.counts = np.empty(0, dtype=np.intp)
+            self.order = np.empty(0, dtype=np.intp)
+            self.members = np.empty((0, 0), dtype=np.intp)
+            return
+
+        unique, self.row_identity = np.unique(keys, return_inverse=True)
+        self.row_identity = self.row_identity.reshape(-1)
+        self.ids = [key.decode("utf-8") if isinstance(key, bytes) else key for key in unique]
+        self.counts = np.bincount(self.row_identity, minlength=len(self.ids))
+
+        # Rows sorted by identity, and each row's position inside its identity
+        self.order = np.argsort(self.row_identity, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(self.counts)[:-1]))
+        grouped = self.row_identity[self.order]
+        positions = np.arange(len(self.order)) - starts[grouped]
+        self.members = np.full((len(self.ids), int(self.counts.max())), -1, dtype=np.intp)
+        self.members[grouped, positions] = self.order
+
+    def __len__(self):
+        return len(self.ids)
+
+    def identity_of(self, rows):
+        """Map gallery row numbers to identity numbers, keeping -1 for "no row"."""
+        rows = np.asarray(rows, dtype=np.intp)
+        if len(self.row_identity) == 0:
+            return np.full(rows.shape, -1, dtype=np.intp)
+        return np.where(rows >= 0, self.row_identity[np.maximum(rows, 0)], -1)
+
+    def centroids(self, embeddings):
+        """(identities, dim) matrix with the mean embedding of every identity."""
+        if len(self.ids) == 0:
+            return np.empty((0, 128), dtype=np.float32)
+        starts = np.concatenate(([0], np.cumsum(self.counts)[:-1]))
+        grouped = np.asarray(embeddings, dtype=np.float64)[self.order]
+        sums = np.add.reduceat(grouped, starts, axis=0)
+        return (sums / self.counts[:, np.newaxis]).astype(np.float32)
+
+    def top_k_mean(self, distances, k):
+        """Reduce an (M, rows) distance matrix to (M, identities): mean of each identity's k nearest members.
+
+        Identities with fewer than k embeddings average the ones they have;
+        k=1 is the nearest member.
+        """
+        width = self.members.shape[1]
+        gathered = distances[:, np.maximum(self.members, 0)]
+        gathered[:, self.members < 0] = np.inf
+        if k <= 1:
+            return gathered.min(axis=2)
+        k = min(k, width)
+        if k < width:
+            gathered = np.partition(gathered, k - 1, axis=2)[:, :, :k]
+        nearest = np.where(np.isfinite(gathered), gathered, 0.0).sum(axis=2)
+        return nearest / np.minimum(self.counts, k)[np.newaxis, :]
+
+
+def gallery_identities(path):
+    """IdentityGroups of a gallery file, for processes that need the employee IDs but no recognizer.
+
+    A missing file gives an empty group.
+    """
+    if not os.path.exists(path):
+        return IdentityGroups([])
+    return IdentityGroups(load_gallery(path).ids)
@@ -0,0 +1,64 @@
+import numpy as np
+
+
+class FaceMatcher:
+    """Nearest-neighbour matcher over a contiguous float32 gallery matrix."""
+
+    def __init__(self, encodings, tolerance=0.6, sq_norms=None):
+        self.tolerance = tolerance
+        self.set_gallery(encodings, sq_norms)
+
+    def set_gallery(self, encodings, sq_norms=None):
+        """Load the gallery once as an (N, 128) float32 matrix with cached squared norms.
+
+        Memory-mapped float32 galleries are used in place without a copy.
+        """
+        if encodings is None or len(encodings) == 0:
+            self.gallery = np.empty((0, 128), dtype=np.float32)
+        else:
+            self.gallery = np.ascontiguousarray(encodings, dtype=np.float32).reshape(len(encodings), -1)
+        if sq_norms is not None and len(sq_norms) == len(self.gallery):
+            self.gallery_sq_norms = sq_norms
+        else:
+            self.gallery_sq_norms = np.einsum("ij,ij->i", self.gallery, self.gallery)
+
+    def __len__(self):
+        return self.gallery.shape[0]
+
+    def squared_distances(self, queries):
+        """Squared euclidean distances of an (M, 128) query block to every gallery row."""
+        queries = np.ascontiguousarray(queries, dtype=np.float32).reshape(-1, self.gallery.shape[1])
+        query_sq_norms = np.einsum("ij,ij->i", queries, queries)
+        # ||g - q||^2 = ||g||^2 - 2 g.q + ||q||^2, with the cross term as a single GEMM
+        dist_sq = queries @ self.gallery.T
+        dist_sq *= -2.0
+        dist_sq += self.gallery_sq_norms[np.newaxis, :]
+        dist_sq += query_sq_norms[:, np.newaxis]
+        np.maximum(dist_sq, 0.0, out=dist_sq)
+        return dist_sq
+
+    def match(self, encoding):
+        """Return (best_index, distance, is_match) for a single face encoding."""
+        indices, distances, matches = self.match_batch(np.asarray(encoding)[np.newaxis, :])
+        if len(indices) == 0:
+            return -1, float("inf"), False
+        return int(indices[0]), float(distances[0]), bool(matches[0])
+
+    def match_batch(self, encodings):
+        """Score every face of a frame against the gallery in one matrix product.
+
+        Returns three arrays of length M: best gallery index, euclidean distance
+        and the tolerance decision. Empty galleries yield index -1 and inf distance.
+        """
+        count = len(encodings)
+        if count == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32), np.empty(0, dtype=bool)
+        if len(self) == 0:
+            return (np.full(count, -1, dtype=np.intp),
+                    np.full(count, np.inf, dtype=np.float32),
+                    np.zeros(count, dtype=bool))
+
+        dist_sq = self.squared_distances(encodings)
+        indices = np.argmin(dist_sq, axis=1)
+        distances = np.sqrt(dist_sq[np.arange(count), indices])
+        return indices, distances, distances <= self.tolerance
@@ -0,0 +1,66 @@
+import time
+import cv2
+
+
+class MotionGate:
+    """Frame-difference gate that skips face detection while the scene is static.
+
+    Each frame is compared, at a small grayscale resolution, against a running
+    average background. Detection runs when the fraction of changed pixels
+    reaches ``sensitivity`` or when ``full_check_interval`` seconds have passed
+    since the last processed frame.
+    """
+
+    def __init__(self, sensitivity=0.005, pixel_threshold=25, scale=0.125, learning_rate=0.05, full_check_interval=5.0):
+        self.sensitivity = sensitivity
+        self.pixel_threshold = pixel_threshold
+        self.scale = scale
+        self.learning_rate = learning_rate
+        self.full_check_interval = full_check_interval
+        self.background = None
+        self.last_processed_time = None
+        self.frames_gated = 0
+        self.frames_processed = 0
+        self.forced_checks = 0
+        self.last_change_ratio = 0.0
+
+    def should_process(self, frame, now=None):
+        """Update the background model and decide whether this frame needs detection."""
+        now = time.monotonic() if now is None else now
+        small = cv2.resize(frame, (0, 0), None, self.scale, self.scale, interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype("float32")
+            return self._processed(now)
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        _, changed = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        self.last_change_ratio = cv2.countNonZero(changed) / changed.size
+        cv2.accumulateWeighted(gray, self.background, self.learning_rate)
+
+        if self.last_change_ratio >= self.sensitivity:
+            return self._processed(now)
+        if now - self.last_processed_time >= self.full_check_interval:
+            self.forced_checks += 1
+            return self._processed(now)
+
+        self.frames_gated += 1
+        return False
+
+    def _processed(self, now):
+        self.frames_processed += 1
+        self.last_processed_time = now
+        return True
+
+    def stats(self):
+        return {
+            "frames_gated": self.frames_gated,
+            "frames_processed": self.frames_processed,
+            "forced_checks": self.forced_checks,
+            "last_change_ratio": self.last_change_ratio,
+        }
+
+    def reset(self):
+        self.background = None
+        self.last_processed_time = None
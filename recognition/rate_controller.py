@@ -0,0 +1,168 @@
+import asyncio
+import time
+
+from utils.metrics import REGISTRY
+
+
+class RateGroup:
+    """Processing capacity shared by the rate controllers of several cameras.
+
+    ``capacity`` is how many frames can be analysed at the same time: 1 when
+    analysis runs on the event loop, the worker count with a worker pool. Each
+    member may keep busy for at most ``capacity / members`` of the wall time,
+    so adding cameras lowers every camera's rate instead of building a backlog.
+    """
+
+    def __init__(self, capacity=1.0):
+        self.capacity = capacity
+        self.members = []
+
+    def join(self, controller):
+        self.members.append(controller)
+
+    def leave(self, controller):
+        if controller in self.members:
+            self.members.remove(controller)
+
+    @property
+    def share(self):
+        return self.capacity / max(1, len(self.members))
+
+
+class RateController:
+    """Paces process_frame calls for one camera against a capture-to-decision latency budget.
+
+    Processing time and latency are tracked as moving averages. The rate
+    follows the measured processing time, between ``min_fps`` and
+    ``max_fps``, so the camera never uses more than its share of the group.
+    When latency stays over ``latency_budget`` the detection scale is lowered
+    by ``scale_step`` (down to ``min_scale``), and raised again once latency
+    falls below ``headroom`` times the budget. Gaps in the capture sequence are
+    counted as dropped frames.
+    """
+
+    def __init__(self, latency_budget=0.3, max_fps=10.0, min_fps=1.0, min_scale=0.5, scale_step=0.1, headroom=0.6,
+                 smoothing=0.2, settle_frames=5, poll_interval=0.005, group=None, name="default"):
+        self.latency_budget = latency_budget
+        self.max_fps = max_fps
+        self.min_fps = min_fps
+        self.min_scale = min_scale
+        self.scale_step = scale_step
+        self.headroom = headroom
+        self.smoothing = smoothing
+        self.settle_frames = settle_frames
+        self.poll_interval = poll_interval
+        self.group = group or RateGroup()
+        self.group.join(self)
+        self.name = name
+
+        self.scale = 1.0
+        self.busy = None
+        self.latency = None
+        self.period = None
+        self.settle = 0
+        self.last_start = None
+        self.next_due = 0.0
+        self.last_sequence = None
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.scale_changes = 0
+
+        self.latency_histogram = REGISTRY.histogram("decision_latency_seconds",
+                                                    "Seconds from frame capture to the end of its processing",
+                                                    camera=name)
+        self.dropped_counter = REGISTRY.counter("frames_dropped_total", "Captured frames never processed",
+                                                camera=name)
+        self.fps_gauge = REGISTRY.gauge("process_fps", "Achieved processing rate", camera=name)
+        self.scale_gauge = REGISTRY.gauge("detect_scale", "Current detection downscale factor", camera=name)
+        self.scale_gauge.set(self.scale)
+
+    def _average(self, current, value):
+        return value if current is None else current + self.smoothing * (value - current)
+
+    @property
+    def interval(self):
+        """Seconds between the starts of two processed frames."""
+        min_interval = 1.0 / self.max_fps
+        max_interval = 1.0 / self.min_fps
+        if self.busy is None:
+            return min_interval
+        # Stay within this camera's share of the group's processing capacity
+        return min(max(min_interval, self.busy / self.group.share), max_interval)
+
+    def record(self, started, finished, captured_at=None, sequence=None):
+        """Learn from one processed frame; times are time.monotonic() values."""
+        if self.last_start is not None:
+            self.period = self._average(self.period, started - self.last_start)
+            if self.period > 0:
+                self.fps_gauge.set(1.0 / self.period)
+        self.last_start = started
+        self.frames_processed += 1
+        self.busy = self._average(self.busy, finished - started)
+
+        if captured_at is not None:
+            latency = finished - captured_at
+            self.latency_histogram.observe(latency)
+            self.latency = self._average(self.latency, latency)
+        if sequence is not None:
+            if self.last_sequence is not None and sequence > self.last_sequence + 1:
+                dropped = sequence - self.last_sequence - 1
+                self.frames_dropped += dropped
+                self.dropped_counter.inc(dropped)
+            self.last_sequence = sequence
+
+        self.next_due = started + self.interval
+        self._adapt()
+
+    def _adapt(self):
+        if self.settle > 0:
+            self.settle -= 1
+            return
+        latency = self.latency if self.latency is not None else self.busy
+        # Still too slow at the lowest rate means this camera is over its share no matter how it is paced
+        overloaded = latency > self.latency_budget or self.busy / self.group.share > 1.0 / self.min_fps
+        if overloaded and self.scale > self.min_scale:
+            self._set_scale(max(self.min_scale, self.scale - self.scale_step))
+        elif not overloaded and self.scale < 1.0 and latency < self.latency_budget * self.headroom \
+                and self.interval <= 1.0 / self.max_fps:
+            self._set_scale(min(1.0, self.scale + self.scale_step))
+
+    def _set_scale(self, scale):
+        self.scale = round(scale, 4)
+        self.scale_changes += 1
+        self.scale_gauge.set(self.scale)
+        # Let the averages catch up with the new scale before judging it
+        self.settle = self.settle_frames
+
+    async def process(self, system, frame, sequence=None):
+        """Run a Frame through system.process_frame at the current detection scale and record its timing.
+
+        The system takes over the caller's reference to the frame.
+        """
+        captured_at = frame.timestamp
+        system.detect_scale = self.scale
+        started = time.monotonic()
+        system.set_frame(frame)
+        await system.process_frame()
+        self.record(started, time.monotonic(), captured_at, sequence)
+
+    async def wait(self):
+        """Sleep until the next frame is due, or briefly when it already is and no new frame was ready."""
+        delay = self.next_due - time.monotonic()
+        await asyncio.sleep(delay if delay > 0 else self.poll_interval)
+
+    def close(self):
+        self.group.leave(self)
+
+    def stats(self):
+        return {
+            "fps": 1.0 / self.period if self.period else 0.0,
+            "target_fps": 1.0 / self.interval,
+            "busy_ms": (self.busy or 0.0) * 1000,
+            "latency_ms": (self.latency or 0.0) * 1000,
+            "latency_p95_ms": self.latency_histogram.percentile(0.95) * 1000,
+            "detect_scale": self.scale,
+            "frames_processed": self.frames_processed,
+            "frames_dropped": self.frames_dropped,
+            "scale_changes": self.scale_changes,
+        }
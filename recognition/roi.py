@@ -0,0 +1,100 @@
+import cv2
+import numpy as np
+
+from recognition.detectors import _downscale, _to_full_frame
+from recognition.tracker import box_iou
+
+# Regions are configured in frame pixels, or as fractions of the frame when every coordinate is within [0, 1]:
+#   {"rect": [x, y, width, height], "scale": 0.5}
+#   {"polygon": [[x, y], [x, y], ...], "scale": 0.35, "name": "turnstile"}
+
+
+class RegionOfInterest:
+    """Rectangle or polygon of the frame that face detection is restricted to.
+
+    Detection scans the region's bounding rectangle, downscaled by ``scale`` on
+    top of the detector's own scale. For polygons, faces whose centre falls
+    outside the polygon are dropped.
+    """
+
+    def __init__(self, rect=None, polygon=None, scale=1.0, name=None):
+        if (rect is None) == (polygon is None):
+            raise ValueError("A region of interest needs exactly one of rect or polygon")
+        if rect is not None:
+            x, y, width, height = rect
+            points = [[x, y], [x + width, y], [x + width, y + height], [x, y + height]]
+        else:
+            points = polygon
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(self.points) < 3:
+            raise ValueError("A region of interest polygon needs at least three points")
+        self.is_polygon = polygon is not None
+        self.relative = bool(np.all((self.points >= 0) & (self.points <= 1)))
+        self.scale = scale
+        self.name = name
+        self._resolved = {}
+
+    def polygon(self, width, height):
+        """Integer (N, 2) pixel polygon for a frame of this size."""
+        key = (width, height)
+        if key not in self._resolved:
+            points = self.points * (width, height) if self.relative else self.points
+            self._resolved[key] = np.round(points).astype(np.int32)
+        return self._resolved[key]
+
+    def bounds(self, width, height):
+        """(top, right, bottom, left) of the region's bounding rectangle, clipped to the frame."""
+        points = self.polygon(width, height)
+        left, top = np.maximum(points.min(axis=0), 0)
+        right, bottom = np.minimum(points.max(axis=0), (width, height))
+        return int(top), int(right), int(bottom), int(left)
+
+    def contains(self, box, width, height):
+        if not self.is_polygon:
+            return True
+        top, right, bottom, left = box
+        centre = ((left + right) / 2.0, (top + bottom) / 2.0)
+        return cv2.pointPolygonTest(self.polygon(width, height).reshape(-1, 1, 2), centre, False) >= 0
+
+    def area_ratio(self, width, height):
+        """Fraction of the frame scanned for this region (its clipped bounding rectangle)."""
+        top, right, bottom, left = self.bounds(width, height)
+        return max(0, right - left) * max(0, bottom - top) / float(width * height)
+
+
+def parse_regions(config):
+    """Build RegionOfInterest objects from a camera's "roi" list; None or [] means the whole frame."""
+    return [RegionOfInterest(**region) for region in config or []]
+
+
+def detect_in_regions(detector, frame, regions, detect_scale=1.0, iou_threshold=0.5):
+    """Run detector on each region's crop only and return boxes in full-frame coordinates.
+
+    A face found by two overlapping regions is reported once.
+    """
+    height, width = frame.shape[:2]
+    boxes = []
+    for region in regions:
+        top, right, bottom, left = region.bounds(width, height)
+        if bottom <= top or right <= left:
+            continue
+        scale = region.scale * detect_scale
+        crop = _downscale(frame[top:bottom, left:right], scale)
+        found = _to_full_frame(detector.detect(crop), scale, (top, left))
+        boxes.extend(box for box in found if region.contains(box, width, height))
+
+    if len(regions) < 2 or len(boxes) < 2:
+        return boxes
+    overlap = box_iou(boxes, boxes)
+    kept = []
+    for index in range(len(boxes)):
+        if all(overlap[index, other] < iou_threshold for other in kept):
+            kept.append(index)
+    return [boxes[index] for index in kept]
+
+
+def draw_regions(frame, regions, color=(200, 200, 200)):
+    """Outline every region on a BGR frame in place."""
+    height, width = frame.shape[:2]
+    for region in regions:
+        cv2.polylines(frame, [region.polygon(width, height).reshape(-1, 1, 2)], True, color, 1)
@@ -1,21 +1,52 @@
 import os
+import time
 import cv2
-import numpy as np
-from datetime import datetime, timedelta
-from PyQt6.QtCore import QObject, pyqtSignal
-
-
-class FaceRecognitionSystem(QObject):
-    face_detected_signal = pyqtSignal(dict)
-    status_signal = pyqtSignal(str)
-    processed_frame_signal = pyqtSignal(np.ndarray)
-
-    def __init__(self, db, face_recognition, encoded_image_path):
-        super().__init__()
+from datetime import datetime
+
+from recognition.analyzer import FrameAnalyzer
+from recognition.roi import draw_regions
+from utils.frame_pool import COPY_STATS, Frame, OverlayBuffer
+from utils.metrics import REGISTRY
+from utils.signals import Signal
+
+
+class FaceRecognitionSystem:
+    def __init__(self, db, face_recognition, encoded_image_path, tracker=None, motion_gate=None, camera_id=None,
+                 worker_pool=None, attendance_writer=None, employee_cache=None, regions=None, batcher=None):
+        # Plain callback signals keep the recognition path free of Qt
+        self.face_detected_signal = Signal()
+        self.status_signal = Signal()
+        self.processed_frame_signal = Signal()
+        self.camera_id = camera_id
         self.db = db
         self.face_recognition = face_recognition
+        # Gate, detection, tracking and matching run in-process unless a worker pool is given;
+        # with one, face_recognition may be None
+        self.analyzer = FrameAnalyzer(face_recognition, tracker, motion_gate, regions)
+        # Regions of interest are outlined on the processed frame
+        self.regions = self.analyzer.regions
+        self.tracker = self.analyzer.tracker
+        self.motion_gate = self.analyzer.motion_gate
+        self.worker_pool = worker_pool
+        # In-process, faces are encoded in batches shared with other cameras when a batcher is given
+        self.batcher = batcher
+        if batcher is not None:
+            batcher.join(self.analyzer)
+        # Attendance marks are spooled and written in batches; the writer also keeps attendance_summary
+        # current, which the 30 second re-mark rule reads back
+        if attendance_writer is None:
+            raise ValueError("FaceRecognitionSystem needs an AttendanceWriter: marks only reach "
+                             "attendance_summary through its refresh")
+        self.attendance_writer = attendance_writer
+        # Employee rows are read through the cache when one is given
+        self.employee_cache = employee_cache
+        self.employees = employee_cache or db
         self.current_frame = None
+        # Boxes are drawn into one reusable buffer instead of a fresh copy per frame
+        self.overlay = OverlayBuffer()
         self.processing = False
+        # Extra downscale before detection, lowered by a RateController when the camera falls behind
+        self.detect_scale = 1.0
         self.counter = 0
         self.id = -1
         self.last_detection_time = datetime.now()
@@ -23,39 +54,75 @@ class FaceRecognitionSystem(QObject):
         # Create needed folder for captured images
         os.makedirs("data/Capture_Images", exist_ok=True)
         self.image_saved = False
+        self.init_metrics()
+
+    def init_metrics(self):
+        """Per-camera counters and stage histograms in the process-wide metrics registry."""
+        camera = str(self.camera_id) if self.camera_id is not None else "default"
+        self.frame_time = REGISTRY.histogram("process_frame_seconds", "Wall time of process_frame", camera=camera)
+        self.stage_time = {stage: REGISTRY.histogram("process_frame_stage_seconds", "Seconds per process_frame stage",
+                                                     camera=camera, stage=stage)
+                           for stage in ("analyze", "render", "save_face", "lookup", "attendance")}
+        self.frame_age = REGISTRY.histogram("frame_age_seconds", "Age of a frame when its processing starts",
+                                            camera=camera)
+        self.frames_total = REGISTRY.counter("frames_processed_total", "Frames passed to process_frame", camera=camera)
+        self.frames_gated = REGISTRY.counter("frames_gated_total", "Frames skipped by the motion gate", camera=camera)
 
     def set_frame(self, frame):
-        self.current_frame = frame.copy()
+        """Make frame the next one to process; a Frame's reference is taken over, arrays are copied."""
+        if not isinstance(frame, Frame):
+            COPY_STATS.record("set_frame", frame.nbytes)
+            frame = Frame(frame.copy())
+        previous, self.current_frame = self.current_frame, frame
+        if previous is not None:
+            previous.release()
 
     async def process_frame(self):
         if self.current_frame is None or self.processing:
             return
 
         self.processing = True
+        # Hold our own reference so set_frame can move on while this frame is analysed
+        frame_ref = self.current_frame.retain()
+        start = time.perf_counter()
+        if frame_ref.timestamp is not None:
+            self.frame_age.observe(time.monotonic() - frame_ref.timestamp)
 
         try:
-            frame = self.current_frame.copy()
-            frame_with_rect = frame.copy()
-
-            # Detect faces
-            faceCurFrame, encodeCurFace = self.face_recognition.recognize_faces(frame)
-
-            if faceCurFrame:
-                for encodeFace, facLoc in zip(encodeCurFace, faceCurFrame):
-                    if len(self.face_recognition.encodeListKnown) == 0:
-                        self.status_signal.emit("No encoded faces available")
-                        continue
-
-                    matches, matchIndex = self.face_recognition.match_faces(encodeFace)
-
-                    if matches and matches[matchIndex]:
-                        # Draw rectangle around face
-                        y1, x2, y2, x1 = facLoc
-                        y1, x2, y2, x1 = y1 * 4, x2 * 4, y2 * 4, x1 * 4
-                        cv2.rectangle(frame_with_rect, (x1, y1), (x2, y2), (0, 255, 0), 2)
-
+            # Analysis only reads the frame, so it works on the shared buffer directly
+            frame = frame_ref.data
+
+            with self.stage_time["analyze"].time():
+                if self.worker_pool is not None:
+                    # Recognition runs in a worker process; the event loop stays free meanwhile
+                    result = await self.worker_pool.analyze(self.camera_id, frame, self.detect_scale)
+                elif self.batcher is not None:
+                    result = await self.analyzer.analyze_batched(frame, self.batcher, self.detect_scale)
+                else:
+                    result = self.analyzer.analyze(frame, self.detect_scale)
+            if result is None:
+                return
+            tracks, gated = result
+            self.frames_total.inc()
+            if gated:
+                self.frames_gated.inc()
+
+            frame_with_rect = None
+            if self.processed_frame_signal.has_slots():
+                with self.stage_time["render"].time():
+                    frame_with_rect = self.overlay.copy_from(frame)
+                    draw_regions(frame_with_rect, self.regions)
+                    self.draw_tracks(frame_with_rect, tracks)
+
+            # Static scene: the current tracks were already handled when they were detected
+            if tracks and not gated:
+                if self.face_recognition is not None and len(self.face_recognition.encodeListKnown) == 0:
+                    self.status_signal.emit("No encoded faces available")
+
+                for track in tracks:
+                    if track.is_match:
                         # Process matched face
-                        employee_id = self.face_recognition.employeeIds[matchIndex]
+                        employee_id = track.employee_id
 
                         # Check time since last detection to avoid processing too frequently
                         time_diff = (datetime.now() - self.last_detection_time).total_seconds()
@@ -65,20 +132,31 @@ class FaceRecognitionSystem(QObject):
                             self.last_processed_id = employee_id
                             self.last_detection_time = datetime.now()
 
-                            face_img = await self.save_and_display_face(frame, employee_id)
+                            with self.stage_time["save_face"].time():
+                                face_img = await self.save_and_display_face(frame, employee_id)
 
                             # Process employee info
-                            await self.process_employee(self.id, face_img)
+                            await self.process_employee(self.id, face_img, track.distance)
 
-            # Emit processed frame
-            self.processed_frame_signal.emit(frame_with_rect)
+            # Emit processed frame; slots must copy it before returning, the buffer is reused
+            if frame_with_rect is not None:
+                self.processed_frame_signal.emit(frame_with_rect)
 
         except Exception as e:
             self.status_signal.emit(f"Processing error: {str(e)}")
 
         finally:
+            frame_ref.release()
+            self.frame_time.observe(time.perf_counter() - start)
             self.processing = False
 
+    def draw_tracks(self, frame_with_rect, tracks):
+        # Draw rectangle around every recognised face
+        for track in tracks:
+            if track.is_match:
+                y1, x2, y2, x1 = track.box
+                cv2.rectangle(frame_with_rect, (x1, y1), (x2, y2), (0, 255, 0), 2)
+
     async def save_and_display_face(self, frame, employee_id):
         folderPath = 'data/Capture_Images'
         face_filename = os.path.join(folderPath, f'{employee_id}.jpg')
@@ -100,17 +178,29 @@ class FaceRecognitionSystem(QObject):
             self.status_signal.emit(f"Error: Could not read saved face image for employee {employee_id}")
             return frame
 
-    async def process_employee(self, employee_id, face_img):
+    async def process_employee(self, employee_id, face_img, distance=None):
         try:
             # Get employee info
-            employeeInfo = await self.db.get_employee_info(employee_id)
+            try:
+                with self.stage_time["lookup"].time():
+                    employeeInfo = await self.employees.get_employee_info(employee_id)
+                offline = employeeInfo is None and not self.db.available
+            except Exception as e:
+                self.status_signal.emit(f"Database error: {str(e)}")
+                employeeInfo, offline = None, True
+
+            if offline:
+                # Database unreachable: decide from local state, the spool writes the mark later
+                employeeInfo = self.offline_employee_info(employee_id)
 
             if employeeInfo:
                 # Check attendance status
-                status = await self.check_attendance(employeeInfo)
+                with self.stage_time["attendance"].time():
+                    status = await self.check_attendance(employeeInfo, distance)
 
                 # Create result dictionary
                 result = {
+                    'camera_id': self.camera_id,
                     'employee_id': employee_id,
                     'name': employeeInfo['name'],
                     'major': employeeInfo['major'],
@@ -127,12 +217,24 @@ class FaceRecognitionSystem(QObject):
         except Exception as e:
             self.status_signal.emit(f"Database error: {str(e)}")
 
-    async def check_attendance(self, employeeInfo):
+    def offline_employee_info(self, employee_id):
+        return {
+            'employee_id': employee_id,
+            'name': f"{employee_id} (offline)",
+            'major': "",
+            'total_attendance': 0,
+            'last_attendance_time': datetime.min,
+        }
+
+    async def check_attendance(self, employeeInfo, distance=None):
         try:
             last_attendance_time = employeeInfo["last_attendance_time"]
 
             # Handle different types of datetime objects
-            if isinstance(last_attendance_time, datetime):
+            if last_attendance_time is None:
+                # No mark on record yet
+                datetimeObject = datetime.min
+            elif isinstance(last_attendance_time, datetime):
                 datetimeObject = last_attendance_time
             else:
                 # Try different formats if needed
@@ -147,14 +249,20 @@ class FaceRecognitionSystem(QObject):
                         self.status_signal.emit(f"Error parsing date: {last_attendance_time}")
                         datetimeObject = datetime.now()  # Set to current time as a fallback
 
+            # A mark not yet folded into attendance_summary is newer than the row we just read
+            pending = self.attendance_writer.pending_since(self.id)
+            if pending is not None and pending > datetimeObject:
+                datetimeObject = pending
+
             # Calculate time difference
             secondsElapsed = (datetime.now() - datetimeObject).total_seconds()
 
             if secondsElapsed > 30:  # Allow marking attendance after 30 seconds
                 # Update attendance count
                 employeeInfo["total_attendance"] += 1
-                await self.db.update_employee_attendance(self.id, employeeInfo["total_attendance"])
-                await self.db.update_employee_last_attendance_time(self.id, datetime.now())
+                if self.employee_cache is not None:
+                    self.employee_cache.record_attendance(self.id)
+                self.attendance_writer.mark(self.id, self.camera_id, distance)
                 self.image_saved = False  # Reset the image saved flag to allow saving a new image next time
                 return "MARKED"
             else:
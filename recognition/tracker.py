@@ -0,0 +1,125 @@
+import itertools
+import numpy as np
+
+
+class Track:
+    """A face followed across frames, carrying its last recognised identity."""
+
+    def __init__(self, track_id, box, frame_index):
+        self.track_id = track_id
+        self.box = box
+        self.employee_id = None
+        self.match_index = -1
+        self.distance = float("inf")
+        self.is_match = False
+        self.first_frame = frame_index
+        self.last_seen_frame = frame_index
+        self.last_encoded_frame = None
+        self.misses = 0
+
+
+def box_iou(boxes_a, boxes_b):
+    """Pairwise IoU of (top, right, bottom, left) boxes as an (A, B) matrix."""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    top = np.maximum(a[:, None, 0], b[None, :, 0])
+    right = np.minimum(a[:, None, 1], b[None, :, 1])
+    bottom = np.minimum(a[:, None, 2], b[None, :, 2])
+    left = np.maximum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(bottom - top, 0, None) * np.clip(right - left, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 1] - a[:, 3])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 1] - b[:, 3])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def box_centroid_distance(boxes_a, boxes_b):
+    """Pairwise centroid distance normalised by the larger box diagonal."""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    centre_a = np.stack([(a[:, 0] + a[:, 2]) / 2, (a[:, 1] + a[:, 3]) / 2], axis=1)
+    centre_b = np.stack([(b[:, 0] + b[:, 2]) / 2, (b[:, 1] + b[:, 3]) / 2], axis=1)
+    diag_a = np.hypot(a[:, 2] - a[:, 0], a[:, 1] - a[:, 3])
+    diag_b = np.hypot(b[:, 2] - b[:, 0], b[:, 1] - b[:, 3])
+    dist = np.linalg.norm(centre_a[:, None, :] - centre_b[None, :, :], axis=2)
+    return dist / np.maximum(np.maximum(diag_a[:, None], diag_b[None, :]), 1e-9)
+
+
+class FaceTracker:
+    """IoU tracker with a centroid fallback that decides which faces need re-encoding.
+
+    Detected boxes are associated greedily with live tracks by IoU, then by
+    normalised centroid distance for fast movers. A track is encoded when it is
+    created and again every ``refresh_interval`` processed frames; in between it
+    keeps the identity from its last match.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_centroid_distance=0.5, max_misses=5, refresh_interval=30):
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.max_misses = max_misses
+        self.refresh_interval = refresh_interval
+        self.tracks = []
+        self.frame_index = 0
+        self.faces_seen = 0
+        self.faces_encoded = 0
+        self._ids = itertools.count(1)
+
+    def _associate(self, boxes):
+        assignments = {}
+        if not self.tracks or not boxes:
+            return assignments
+
+        track_boxes = [track.box for track in self.tracks]
+        for scores, threshold, higher_is_better in (
+                (box_iou(track_boxes, boxes), self.iou_threshold, True),
+                (box_centroid_distance(track_boxes, boxes), self.max_centroid_distance, False)):
+            scores = scores if higher_is_better else -scores
+            limit = threshold if higher_is_better else -threshold
+            for track_idx, box_idx in zip(*np.unravel_index(np.argsort(-scores, axis=None), scores.shape)):
+                if scores[track_idx, box_idx] < limit:
+                    break
+                if box_idx in assignments or track_idx in assignments.values():
+                    continue
+                assignments[int(box_idx)] = int(track_idx)
+        return assignments
+
+    def update(self, boxes):
+        """Associate this frame's boxes with tracks; returns one Track per box in order."""
+        self.frame_index += 1
+        self.faces_seen += len(boxes)
+        assignments = self._associate(boxes)
+
+        result = []
+        for box_idx, box in enumerate(boxes):
+            if box_idx in assignments:
+                track = self.tracks[assignments[box_idx]]
+                track.box = box
+                track.last_seen_frame = self.frame_index
+                track.misses = 0
+            else:
+                track = Track(next(self._ids), box, self.frame_index)
+                self.tracks.append(track)
+            result.append(track)
+
+        for track in self.tracks:
+            if track.last_seen_frame != self.frame_index:
+                track.misses += 1
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+        return result
+
+    def needs_encoding(self, track):
+        if track.last_encoded_frame is None:
+            return True
+        return self.frame_index - track.last_encoded_frame >= self.refresh_interval
+
+    def assign_identity(self, track, employee_id, match_index, distance, is_match):
+        track.employee_id = employee_id if is_match else None
+        track.match_index = match_index
+        track.distance = distance
+        track.is_match = is_match
+        track.last_encoded_frame = self.frame_index
+        self.faces_encoded += 1
+
+    def reset(self):
+        self.tracks = []
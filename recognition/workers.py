@@ -0,0 +1,411 @@
+import asyncio
+import itertools
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+import numpy as np
+
+from utils.frame_pool import COPY_STATS
+
+# Per-slot header columns of a SharedFrameRing
+SEQ, STATE, HEIGHT, WIDTH, CHANNELS, SUBMIT_NS = range(6)
+HEADER_FIELDS = 6
+SLOT_FREE, SLOT_PENDING, SLOT_BUSY = 0, 1, 2
+WORKER_READY = -1
+
+
+class SharedFrameRing:
+    """Fixed set of frame slots in one shared memory block, guarded by a process lock.
+
+    The parent copies a frame into a free slot and only sends the slot index to
+    the worker, so no frame is ever pickled. A slot is returned to the pool by
+    the worker once it has finished with the frame.
+    """
+
+    def __init__(self, slots, max_frame_bytes, lock, name=None):
+        self.slots = slots
+        self.max_frame_bytes = max_frame_bytes
+        self.lock = lock
+        self.header_bytes = (slots * HEADER_FIELDS * 8 + 63) // 64 * 64
+        size = self.header_bytes + slots * max_frame_bytes
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self.header = np.ndarray((slots, HEADER_FIELDS), dtype=np.int64, buffer=self.shm.buf)
+        self.frames = np.ndarray((slots, max_frame_bytes), dtype=np.uint8, buffer=self.shm.buf, offset=self.header_bytes)
+        if self.owner:
+            self.header[:] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, frame, seq):
+        """Copy a frame into a free slot and return its index, or None when every slot is in use."""
+        if frame.nbytes > self.max_frame_bytes:
+            raise ValueError(f"Frame of {frame.nbytes} bytes exceeds ring slot size {self.max_frame_bytes}")
+        with self.lock:
+            free = np.flatnonzero(self.header[:, STATE] == SLOT_FREE)
+            if len(free) == 0:
+                return None
+            slot = int(free[0])
+            self.header[slot, STATE] = SLOT_PENDING
+        height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        self.frames[slot, :frame.nbytes] = frame.reshape(-1)
+        COPY_STATS.record("worker_ring", frame.nbytes)
+        self.header[slot, [SEQ, HEIGHT, WIDTH, CHANNELS, SUBMIT_NS]] = (seq, height, width, channels, time.monotonic_ns())
+        return slot
+
+    def claim(self, slot):
+        """Mark a pending slot busy and return (seq, submit_ns, frame view)."""
+        with self.lock:
+            self.header[slot, STATE] = SLOT_BUSY
+            seq, height, width, channels, submit_ns = (int(value) for value in
+                                                       self.header[slot, [SEQ, HEIGHT, WIDTH, CHANNELS, SUBMIT_NS]])
+        shape = (height, width, channels) if channels > 1 else (height, width)
+        frame = self.frames[slot, :height * width * channels].reshape(shape)
+        return seq, submit_ns, frame
+
+    def release(self, slot):
+        with self.lock:
+            self.header[slot, STATE] = SLOT_FREE
+
+    def close(self):
+        # Drop numpy views before closing the mapping
+        self.header = None
+        self.frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _worker_main(worker, ring_name, slots, max_frame_bytes, lock, tasks, results, recognition_config, max_age,
+                 batching):
+    """Recognition worker: pulls slot indices, analyses the frames in place and reports tracks back.
+
+    Frames arriving within ``max_wait`` seconds of each other, one per camera,
+    are detected one by one and then encoded and matched as one batch.
+    """
+    # Every spawned worker loads its own recognizer and gallery index
+    from recognition.analyzer import FrameAnalyzer, identify_batch
+    from recognition.face_detector import FaceRecognition
+    from recognition.motion_gate import MotionGate
+    from recognition.roi import parse_regions
+    from recognition.tracker import FaceTracker
+
+    ring = SharedFrameRing(slots, max_frame_bytes, lock, name=ring_name)
+    # The gallery is memory-mapped, so every worker shares the same pages
+    face_recognition = FaceRecognition(**recognition_config)
+    max_batch = batching.get("max_batch", 32)
+    max_wait = batching.get("max_wait", 0.01)
+    analyzers = {}
+    results.put((WORKER_READY, worker, None))
+
+    def register(camera_id, analyzer_config):
+        # Per-camera tracker, motion gate and ROI state lives in the worker the camera is pinned to
+        analyzers[camera_id] = FrameAnalyzer(face_recognition,
+                                             FaceTracker(**analyzer_config.get("tracker", {})),
+                                             MotionGate(**analyzer_config.get("motion_gate", {})),
+                                             parse_regions(analyzer_config.get("roi")))
+
+    def detect(slot, camera_id, detect_scale):
+        """Run the per-frame stages on a ring slot; returns (seq, camera_id, tracks, gated, job) or None."""
+        seq, submit_ns, frame = ring.claim(slot)
+        try:
+            # Frames that waited too long are reported as dropped rather than analysed late
+            if max_age and (time.monotonic_ns() - submit_ns) / 1e9 > max_age:
+                results.put((seq, None, None))
+                return None
+            if camera_id not in analyzers:
+                analyzers[camera_id] = FrameAnalyzer(face_recognition)
+            analyzer = analyzers[camera_id]
+            tracks, gated, imgSmall, pending = analyzer.detect(frame, detect_scale)
+            return seq, camera_id, tracks, gated, (analyzer, imgSmall, pending) if pending else None
+        except Exception as e:
+            results.put((seq, None, str(e)))
+            return None
+        finally:
+            # Encoding works on the downscaled copy, so the slot is free again once detection is done
+            del frame
+            ring.release(slot)
+
+    def finish(batch):
+        jobs = [entry[4] for entry in batch if entry[4] is not None]
+        error = None
+        if jobs:
+            try:
+                identify_batch(face_recognition, jobs)
+            except Exception as e:
+                error = str(e)
+        for seq, _, tracks, gated, _ in batch:
+            results.put((seq, None, error) if error else (seq, (tracks, gated), None))
+
+    running = True
+    task = None
+    while running:
+        if task is None:
+            task = tasks.get()
+        if task is None:
+            break
+
+        batch = []
+        faces = 0
+        deadline = time.monotonic() + max_wait
+        while True:
+            if task[0] == "register":
+                register(task[1], task[2])
+            elif any(entry[1] == task[2] for entry in batch):
+                # A camera's next frame must see the identities assigned for its previous one
+                break
+            else:
+                entry = detect(task[1], task[2], task[3])
+                if entry is not None:
+                    batch.append(entry)
+                    faces += len(entry[4][2]) if entry[4] is not None else 0
+            task = None
+
+            if faces >= max_batch or (batch and {entry[1] for entry in batch} >= set(analyzers)):
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                task = tasks.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if task is None:
+                running = False
+                break
+        finish(batch)
+
+    ring.close()
+
+
+class RecognitionWorkerPool:
+    """Pool of recognition processes fed through shared-memory frame rings.
+
+    Every camera is pinned to one worker so its tracker and motion gate state
+    stay in that process. When a worker's slots are all busy the new frame is
+    dropped instead of queued, and frames older than ``max_age`` seconds are
+    skipped by the worker. Each worker encodes the faces of the frames it
+    receives within ``batching["max_wait"]`` seconds as one batch. A worker
+    that dies is restarted with a fresh ring and its cameras registered again;
+    its frames are dropped until the new process has loaded its gallery.
+    """
+
+    def __init__(self, recognition_config, workers=2, slots_per_worker=2, max_frame_bytes=1920 * 1080 * 3,
+                 max_age=0.5, result_timeout=10.0, startup_timeout=120.0, batching=None, liveness_interval=1.0,
+                 restart_delay=5.0):
+        self.recognition_config = recognition_config
+        self.batching = batching or {}
+        self.workers = workers
+        self.slots_per_worker = slots_per_worker
+        self.max_frame_bytes = max_frame_bytes
+        self.max_age = max_age
+        self.startup_timeout = startup_timeout
+        self.result_timeout = result_timeout
+        self.liveness_interval = liveness_interval
+        self.restart_delay = restart_delay
+        self.last_restart = {}
+        self.context = multiprocessing.get_context("spawn")
+        self.processes = []
+        self.rings = []
+        self.task_queues = []
+        self.results = None
+        self.reader = None
+        self.pending = {}
+        self.ready = set()
+        self.camera_workers = {}
+        self.camera_configs = {}
+        self.sequence = itertools.count(1)
+        self.frames_submitted = 0
+        self.frames_dropped = 0
+        self.restarts = 0
+
+    def _spawn(self, worker):
+        """Start the process for one worker slot; returns (ring, task queue, process)."""
+        lock = self.context.Lock()
+        ring = SharedFrameRing(self.slots_per_worker, self.max_frame_bytes, lock)
+        tasks = self.context.Queue()
+        process = self.context.Process(
+            target=_worker_main,
+            args=(worker, ring.name, self.slots_per_worker, self.max_frame_bytes, lock, tasks, self.results,
+                  self.recognition_config, self.max_age, self.batching),
+            daemon=True)
+        process.start()
+        return ring, tasks, process
+
+    def start(self):
+        """Spawn the workers and block until each has loaded its gallery."""
+        self.results = self.context.Queue()
+        for worker in range(self.workers):
+            ring, tasks, process = self._spawn(worker)
+            self.rings.append(ring)
+            self.task_queues.append(tasks)
+            self.processes.append(process)
+
+        # Poll so a worker that dies while loading fails start() at once instead of at the timeout
+        deadline = time.monotonic() + self.startup_timeout
+        ready = 0
+        while ready < self.workers:
+            try:
+                _, worker, _ = self.results.get(timeout=0.5)
+                self.ready.add(worker)
+                ready += 1
+                continue
+            except queue.Empty:
+                pass
+            dead = [process for process in self.processes if not process.is_alive()]
+            if dead:
+                self.stop()
+                raise RuntimeError(f"Recognition worker exited during startup (exit code {dead[0].exitcode})")
+            if time.monotonic() >= deadline:
+                self.stop()
+                raise RuntimeError("Recognition workers did not start in time")
+
+        self.reader = threading.Thread(target=self._read_results, name="recognition-results", daemon=True)
+        self.reader.start()
+        return self
+
+    def _read_results(self):
+        while True:
+            try:
+                message = self.results.get()
+            except (EOFError, OSError):
+                return
+            if message is None:
+                return
+            seq, result, error = message
+            if seq == WORKER_READY:
+                # A restarted worker has loaded its gallery
+                self.ready.add(result)
+                continue
+            entry = self.pending.pop(seq, None)
+            if entry is None:
+                continue
+            loop, future, _ = entry
+            loop.call_soon_threadsafe(self._resolve, future, result, error)
+
+    def _resolve(self, future, result, error):
+        if future.done():
+            return
+        if error:
+            future.set_exception(RuntimeError(f"Recognition worker error: {error}"))
+        else:
+            future.set_result(result)
+
+    def register_camera(self, camera_id, analyzer_config=None):
+        """Pin a camera to a worker (round robin) and set up its tracker, motion gate and ROIs there."""
+        if camera_id not in self.camera_workers:
+            self.camera_workers[camera_id] = len(self.camera_workers) % self.workers
+        worker = self.camera_workers[camera_id]
+        self.camera_configs[camera_id] = analyzer_config or {}
+        self.task_queues[worker].put(("register", camera_id, self.camera_configs[camera_id]))
+        return worker
+
+    def _restart(self, worker):
+        """Replace a dead worker: fail its in-flight frames, give it a fresh ring and re-register its cameras."""
+        process = self.processes[worker]
+        self.ready.discard(worker)
+        for seq, (_, future, owner) in list(self.pending.items()):
+            if owner == worker:
+                self.pending.pop(seq, None)
+                if not future.done():
+                    future.set_result(None)
+        # A worker that keeps dying (e.g. a broken gallery) is not respawned in a tight loop
+        if time.monotonic() - self.last_restart.get(worker, float("-inf")) < self.restart_delay:
+            return
+        self.last_restart[worker] = time.monotonic()
+        print(f"Recognition worker {worker} exited (exit code {process.exitcode}), restarting it", flush=True)
+        # Nothing will ever read the old queue; do not let its feeder thread block interpreter exit
+        self.task_queues[worker].cancel_join_thread()
+        self.task_queues[worker].close()
+        # Slots the dead process held are reclaimed with the whole ring
+        self.rings[worker].close()
+        self.rings[worker], self.task_queues[worker], self.processes[worker] = self._spawn(worker)
+        self.restarts += 1
+        for camera_id, owner in self.camera_workers.items():
+            if owner == worker:
+                self.task_queues[worker].put(("register", camera_id, self.camera_configs.get(camera_id, {})))
+
+    async def _wait_result(self, worker, future):
+        """Wait for a frame's result; None after result_timeout, or at once if the worker died meanwhile."""
+        deadline = time.monotonic() + self.result_timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), min(remaining, self.liveness_interval))
+            except asyncio.TimeoutError:
+                if not self.processes[worker].is_alive():
+                    self._restart(worker)
+                    return None
+
+    def worker_for(self, camera_id):
+        if camera_id not in self.camera_workers:
+            return self.register_camera(camera_id)
+        return self.camera_workers[camera_id]
+
+    async def analyze(self, camera_id, frame, detect_scale=1.0):
+        """Analyse a frame in the camera's worker; returns (tracks, gated), or None if the frame was dropped."""
+        worker = self.worker_for(camera_id)
+        if not self.processes[worker].is_alive():
+            self._restart(worker)
+        if worker not in self.ready:
+            # Still loading after a restart
+            self.frames_dropped += 1
+            return None
+        seq = next(self.sequence)
+        slot = self.rings[worker].write(frame, seq)
+        if slot is None:
+            self.frames_dropped += 1
+            return None
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending[seq] = (loop, future, worker)
+        self.frames_submitted += 1
+        self.task_queues[worker].put(("frame", slot, camera_id, detect_scale))
+        try:
+            result = await self._wait_result(worker, future)
+        finally:
+            self.pending.pop(seq, None)
+        if result is None:
+            self.frames_dropped += 1
+        return result
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "frames_submitted": self.frames_submitted,
+            "frames_dropped": self.frames_dropped,
+            "in_flight": len(self.pending),
+            "restarts": self.restarts,
+        }
+
+    def stop(self):
+        died = False
+        for tasks, process in zip(self.task_queues, self.processes):
+            if process.is_alive():
+                tasks.put(None)
+            else:
+                # A dead worker never drains its queue; waiting on the feeder thread would hang exit
+                tasks.cancel_join_thread()
+                died = True
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        if self.reader is not None:
+            self.results.put(None)
+            self.reader.join(timeout=5)
+            self.reader = None
+        if died and self.results is not None:
+            self.results.cancel_join_thread()
+        for ring in self.rings:
+            ring.close()
+        self.processes, self.rings, self.task_queues = [], [], []
+        self.ready.clear()
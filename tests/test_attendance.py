@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from AddDatatoDatabase import EMPLOYEE_COLUMNS, employee_values
+from bench.memory_db import MemoryDatabase
+from database.async_database import AttendanceWriter
+from recognition.system import FaceRecognitionSystem
+
+
+def make_system(db):
+    writer = AttendanceWriter(db)
+    return FaceRecognitionSystem(db, None, None, camera_id="test", attendance_writer=writer), writer
+
+
+def test_imported_row_without_last_attendance_time_is_marked(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    values = employee_values({"employee_id": "E1", "name": "New Person", "major": "Physics",
+                              "starting_year": 2024, "year": 1})
+    employee = dict(zip(EMPLOYEE_COLUMNS, values))
+    system, writer = make_system(MemoryDatabase(["E1"]))
+    system.id = "E1"
+
+    assert asyncio.run(system.check_attendance(employee)) == "MARKED"
+    assert writer.pending_since("E1") is not None
+    # The 30 second rule holds for the mark just made
+    assert asyncio.run(system.check_attendance(employee)) == "ALREADY MARKED"
+
+
+def test_null_last_attendance_time_means_never_marked(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    system, _ = make_system(MemoryDatabase(["E2"]))
+    system.id = "E2"
+    employee = {"employee_id": "E2", "name": "Old Row", "total_attendance": 0, "last_attendance_time": None}
+
+    assert asyncio.run(system.check_attendance(employee)) == "MARKED"
+
+
+def test_enrolled_row_from_readme_manifest_is_marked(tmp_path, monkeypatch):
+    from Enroll import validate_rows
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "front.jpg").write_bytes(b"")
+    row = {"employee_id": "234567", "name": "Mandip Chowdhury", "major": "Machine Learning",
+           "starting_year": "2021", "year": "4", "images": "front.jpg"}
+    candidates, rejects = validate_rows([row], str(tmp_path))
+    assert not rejects
+    employee = dict(zip(EMPLOYEE_COLUMNS, candidates[0].values))
+    system, _ = make_system(MemoryDatabase(["234567"]))
+    system.id = "234567"
+
+    assert asyncio.run(system.check_attendance(employee)) == "MARKED"
+
+
+class FlakyDatabase(MemoryDatabase):
+    """MemoryDatabase whose first ``failures`` inserts fail, as while MySQL is down."""
+
+    def __init__(self, employee_ids, failures):
+        super().__init__(employee_ids)
+        self.failures = failures
+        self.refreshes = 0
+
+    async def insert_attendance_events(self, events):
+        if self.failures:
+            self.failures -= 1
+            return False
+        return await super().insert_attendance_events(events)
+
+    async def refresh_attendance_summary(self, settle_seconds=5):
+        self.refreshes += 1
+        return 0
+
+
+def test_mark_replayed_late_stays_pending_until_folded():
+    async def run():
+        db = FlakyDatabase(["E3"], failures=2)
+        writer = AttendanceWriter(db, flush_interval=0.01, retry_delay=0.05, settle_seconds=0.2)
+        writer.mark("E3", marked_at=datetime.now() - timedelta(minutes=5))
+        assert not await writer.flush()
+        assert not await writer.flush()
+        assert await writer.flush()
+
+        # Written just now: a refresh cannot have folded it yet, however old the mark is
+        await writer.refresh_summary()
+        assert writer.pending_since("E3") is not None
+
+        await asyncio.sleep(0.25)
+        await writer.refresh_summary()
+        assert writer.pending_since("E3") is None
+
+    asyncio.run(run())
@@ -1 +1,8 @@
-from utils.video_thread import VideoThread
\ No newline at end of file
+from utils.capture import CaptureSource
+from utils.signals import Signal
+
+try:
+    from utils.video_thread import VideoThread
+except ImportError:
+    # PyQt6 is only installed for the desktop GUI, not for the headless service
+    VideoThread = None
\ No newline at end of file
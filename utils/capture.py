@@ -0,0 +1,189 @@
+import threading
+import time
+import cv2
+
+from utils.frame_pool import FramePool, read_frame
+from utils.metrics import REGISTRY
+from utils.signals import Signal
+
+CAPTURE_BACKENDS = {
+    "any": cv2.CAP_ANY,
+    "v4l2": cv2.CAP_V4L2,
+    "dshow": cv2.CAP_DSHOW,
+    "msmf": cv2.CAP_MSMF,
+    "avfoundation": cv2.CAP_AVFOUNDATION,
+    "gstreamer": cv2.CAP_GSTREAMER,
+    "ffmpeg": cv2.CAP_FFMPEG,
+}
+
+
+def parse_source(source):
+    """Device indices may come from JSON or the command line as strings."""
+    if isinstance(source, str) and source.isdigit():
+        return int(source)
+    return source
+
+
+class CaptureSource(threading.Thread):
+    """Background capture from a camera index, RTSP/HTTP URL or video file, keeping only the newest frame.
+
+    The thread calls ``grab()`` so the device queue never backs up, and only
+    decodes with ``retrieve()`` the grab that follows a consumer's request,
+    into a pooled buffer handed out by reference (see utils.frame_pool). The
+    newest grab is published as a (sequence, monotonic timestamp) tuple in a
+    single slot that readers check without locking. Consumers never touch the
+    device, so latest() never waits on a blocking grab.
+    """
+
+    def __init__(self, source, width=640, height=480, loop=False, reconnect_delay=2.0, name=None, pool_size=4,
+                 backend="any", fps=None, fourcc=None):
+        super().__init__(name=name or f"capture-{source}", daemon=True)
+        if backend not in CAPTURE_BACKENDS:
+            raise ValueError(f"Unknown capture backend: {backend} (choose from {', '.join(CAPTURE_BACKENDS)})")
+        self.source = parse_source(source)
+        self.width = width
+        self.height = height
+        self.loop = loop
+        self.reconnect_delay = reconnect_delay
+        self.backend = backend
+        self.fps = fps
+        self.fourcc = fourcc
+        self.running = True
+        self.error = None
+        self.error_signal = Signal()
+        self.pool = FramePool(size=pool_size)
+        self.device_lock = threading.Lock()
+        # Guards swapping the decoded frame against a reader taking a reference to it
+        self.frame_lock = threading.Lock()
+        self.cap = None
+        self.grabbed = (0, None)
+        self.decoded = None
+        self.wanted = False
+        self.frames_grabbed = 0
+        self.frames_retrieved = 0
+        self.retrieve_time = REGISTRY.histogram("capture_retrieve_seconds", "Seconds to decode a grabbed frame",
+                                                source=self.name)
+        self.is_file = isinstance(self.source, str) and "://" not in self.source
+
+    @property
+    def sequence(self):
+        return self.grabbed[0]
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.source, CAPTURE_BACKENDS[self.backend])
+        if not cap.isOpened():
+            return None
+        if isinstance(self.source, int):
+            # FOURCC first: some drivers only offer high resolutions or rates in MJPG
+            if self.fourcc:
+                cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.fourcc))
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+            if self.fps:
+                cap.set(cv2.CAP_PROP_FPS, self.fps)
+            # Keep the driver queue short so grab() returns the newest frame
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cap
+
+    def _set_error(self, error):
+        if error != self.error:
+            self.error = error
+            if error:
+                self.error_signal.emit(error)
+
+    def run(self):
+        while self.running:
+            cap = self._open()
+            if cap is None:
+                self._set_error(f"Unable to open source {self.source}")
+                if self.is_file:
+                    self.running = False
+                    return
+                time.sleep(self.reconnect_delay)
+                continue
+
+            self._set_error(None)
+            self.cap = cap
+            frame_interval = 0.0
+            if self.is_file:
+                # Replay files at their recorded rate instead of as fast as they decode
+                fps = cap.get(cv2.CAP_PROP_FPS)
+                frame_interval = 1.0 / fps if fps and fps > 0 else 0.0
+
+            while self.running:
+                with self.device_lock:
+                    ok = cap.grab()
+                    if ok:
+                        # Single-slot publish: readers only ever see a complete tuple
+                        sequence, timestamp = self.grabbed = (self.grabbed[0] + 1, time.monotonic())
+                        self.frames_grabbed += 1
+                        if self.wanted:
+                            self.wanted = False
+                            self._decode(cap, sequence, timestamp)
+                if not ok:
+                    break
+                if frame_interval:
+                    time.sleep(frame_interval)
+
+            with self.device_lock:
+                self.cap = None
+                cap.release()
+            if self.is_file and not self.loop:
+                self.running = False
+            elif self.running and not self.is_file:
+                self._set_error(f"Lost source {self.source}, reconnecting")
+                time.sleep(self.reconnect_delay)
+
+    def _decode(self, cap, sequence, timestamp):
+        """Retrieve the frame just grabbed into a pooled buffer and publish it for latest()."""
+        with self.retrieve_time.time():
+            frame = read_frame(cap, self.pool, retrieve=True)
+        if frame is None:
+            return
+        frame.sequence, frame.timestamp = sequence, timestamp
+        self.frames_retrieved += 1
+        with self.frame_lock:
+            previous, self.decoded = self.decoded, frame
+        if previous is not None:
+            previous.release()
+
+    def latest(self, since=None, max_age=None):
+        """Return (frame, sequence) of the newest decoded frame grabbed after ``since``.
+
+        Never blocks on the device: when no such frame is decoded yet, the
+        capture thread is asked to decode its next grab and (None, sequence)
+        is returned, so consumers simply poll again. frame is also None when
+        the newest grab is older than ``max_age`` seconds (a stalled stream).
+        Otherwise the caller owns a reference and must release() it;
+        frame.sequence and frame.timestamp identify the grab.
+        """
+        sequence, timestamp = self.grabbed
+        if sequence == 0 or sequence == since:
+            return None, sequence
+        now = time.monotonic()
+        if max_age is not None and now - timestamp > max_age:
+            return None, sequence
+
+        with self.frame_lock:
+            decoded = self.decoded
+            if decoded is not None and (since is None or decoded.sequence > since) \
+                    and (max_age is None or now - decoded.timestamp <= max_age):
+                return decoded.retain(), decoded.sequence
+        self.wanted = True
+        return None, sequence
+
+    def stats(self):
+        return {
+            "frames_grabbed": self.frames_grabbed,
+            "frames_retrieved": self.frames_retrieved,
+            "error": self.error,
+        }
+
+    def stop(self):
+        self.running = False
+        if self.is_alive():
+            self.join(timeout=5)
+        with self.frame_lock:
+            decoded, self.decoded = self.decoded, None
+        if decoded is not None:
+            decoded.release()
@@ -0,0 +1,150 @@
+import threading
+import numpy as np
+
+
+class CopyStats:
+    """Per-stage count of frame copies and bytes moved, shared by the whole pipeline."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+
+    def record(self, stage, nbytes):
+        with self.lock:
+            entry = self.stages.setdefault(stage, [0, 0])
+            entry[0] += 1
+            entry[1] += int(nbytes)
+
+    def snapshot(self):
+        with self.lock:
+            return {stage: {"copies": copies, "bytes": nbytes} for stage, (copies, nbytes) in self.stages.items()}
+
+    def reset(self):
+        with self.lock:
+            self.stages.clear()
+
+
+COPY_STATS = CopyStats()
+
+
+class Frame:
+    """Reference-counted frame buffer handed between capture, recognition and display without copying.
+
+    A new frame starts with one reference owned by whoever acquired it. Every
+    other holder calls ``retain()`` and each holder calls ``release()`` once;
+    the buffer returns to its pool when the last reference goes. ``generation``
+    is unique per acquire, so a holder can tell a reused buffer from its frame.
+    Capture sets ``sequence`` and the monotonic capture ``timestamp``.
+    """
+
+    def __init__(self, data, pool=None, generation=0):
+        self.data = data
+        self.pool = pool
+        self.generation = generation
+        self.sequence = 0
+        self.timestamp = None
+        self.refcount = 1
+        self.lock = threading.Lock()
+
+    def retain(self):
+        with self.lock:
+            if self.refcount <= 0:
+                raise RuntimeError(f"Frame generation {self.generation} retained after release")
+            self.refcount += 1
+        return self
+
+    def release(self):
+        with self.lock:
+            self.refcount -= 1
+            recycle = self.refcount == 0
+        if recycle and self.pool is not None:
+            self.pool._recycle(self.data)
+
+
+class FramePool:
+    """Preallocated buffers of one frame shape that are reused instead of allocated per frame.
+
+    The pool follows the source resolution: when a frame of a new shape is
+    acquired or adopted the old free buffers are dropped. Frames still held
+    elsewhere are not tracked, so a leaked reference costs one allocation, not a deadlock.
+    """
+
+    def __init__(self, size=4, dtype=np.uint8):
+        self.size = size
+        self.dtype = dtype
+        self.lock = threading.Lock()
+        self.shape = None
+        self.free = []
+        self.generation = 0
+        self.allocations = 0
+        self.reuses = 0
+
+    def acquire(self, shape=None):
+        """Return a Frame holding one reference to a free buffer (of the pool's current shape by default)."""
+        shape = tuple(shape or self.shape)
+        with self.lock:
+            if shape != self.shape:
+                self.shape = shape
+                self.free.clear()
+            if self.free:
+                data = self.free.pop()
+                self.reuses += 1
+            else:
+                data = np.empty(shape, dtype=self.dtype)
+                self.allocations += 1
+            self.generation += 1
+            return Frame(data, self, self.generation)
+
+    def adopt(self, data):
+        """Wrap a buffer allocated elsewhere (e.g. by the decoder) so it joins the pool on release."""
+        with self.lock:
+            if data.shape != self.shape:
+                self.shape = data.shape
+                self.free.clear()
+            self.allocations += 1
+            self.generation += 1
+            return Frame(data, self, self.generation)
+
+    def _recycle(self, data):
+        with self.lock:
+            if data.shape == self.shape and len(self.free) < self.size:
+                self.free.append(data)
+
+    def stats(self):
+        with self.lock:
+            return {"shape": self.shape, "free": len(self.free), "allocations": self.allocations, "reuses": self.reuses}
+
+
+def read_frame(cap, pool, retrieve=False):
+    """Decode the next frame of a cv2.VideoCapture straight into a pooled buffer; returns a Frame or None.
+
+    With retrieve=True the frame already grabbed is decoded instead of reading a new one.
+    """
+    decode = cap.retrieve if retrieve else cap.read
+    frame = pool.acquire() if pool.shape else None
+    ret, data = decode(frame.data) if frame is not None else decode()
+    if not ret:
+        if frame is not None:
+            frame.release()
+        return None
+    if frame is None or data is not frame.data:
+        # First frame or a resolution change: the decoder allocated its own buffer
+        if frame is not None:
+            frame.release()
+        frame = pool.adopt(data)
+    return frame
+
+
+class OverlayBuffer:
+    """Reusable destination for drawing annotations over a frame without allocating per frame."""
+
+    def __init__(self, stage="overlay"):
+        self.stage = stage
+        self.buffer = None
+
+    def copy_from(self, data):
+        if self.buffer is None or self.buffer.shape != data.shape or self.buffer.dtype != data.dtype:
+            self.buffer = np.empty_like(data)
+        np.copyto(self.buffer, data)
+        COPY_STATS.record(self.stage, data.nbytes)
+        return self.buffer
@@ -0,0 +1,253 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds, from sub-millisecond queries to multi-second stalls
+DEFAULT_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram of observed values (seconds for latencies).
+
+    Percentiles are estimated as the upper bound of the bucket they fall in,
+    so they are only as precise as the buckets.
+    """
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # The extra last bucket counts values above the highest bound
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.count = 0
+            self.sum = 0.0
+            self.max = 0.0
+
+    def time(self):
+        """Context manager observing the seconds spent inside the block."""
+        return Timer(self)
+
+    def observe(self, value):
+        with self.lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, q):
+        with self.lock:
+            return self._percentile(q)
+
+    def _percentile(self, q):
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self):
+        with self.lock:
+            cumulative = []
+            seen = 0
+            for bound, count in zip(self.buckets, self.counts):
+                seen += count
+                cumulative.append((bound, seen))
+            return {
+                "count": self.count,
+                "sum": self.sum,
+                "mean": self.sum / self.count if self.count else 0.0,
+                "max": self.max,
+                "p50": self._percentile(0.5),
+                "p95": self._percentile(0.95),
+                "p99": self._percentile(0.99),
+                "buckets": cumulative,
+            }
+
+
+class Timer:
+    """Times a block with perf_counter and observes the duration into a histogram."""
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Counter:
+    """Monotonically increasing count."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def reset(self):
+        with self.lock:
+            self.value = 0
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    """Last value of something that goes up and down, such as a rate or a scale."""
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def snapshot(self):
+        return self.value
+
+
+class MetricsRegistry:
+    """Named counters, gauges and histograms, each family split by label values.
+
+    Asking twice for the same name and labels returns the same metric, so hot
+    paths look their metrics up once and then only pay for observe()/inc().
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # name -> {"type", "help", "children": {labels tuple: metric}}
+        self.families = {}
+
+    def _metric(self, kind, name, help, labels, factory):
+        key = tuple(sorted((label, str(value)) for label, value in labels.items()))
+        with self.lock:
+            family = self.families.setdefault(name, {"type": kind, "help": help, "children": {}})
+            if family["type"] != kind:
+                raise ValueError(f"Metric {name} is already registered as a {family['type']}")
+            metric = family["children"].get(key)
+            if metric is None:
+                metric = family["children"][key] = factory()
+            return metric
+
+    def counter(self, name, help="", **labels):
+        return self._metric("counter", name, help, labels, Counter)
+
+    def gauge(self, name, help="", **labels):
+        return self._metric("gauge", name, help, labels, Gauge)
+
+    def histogram(self, name, help="", buckets=DEFAULT_LATENCY_BUCKETS, **labels):
+        return self._metric("histogram", name, help, labels, lambda: Histogram(buckets))
+
+    def _items(self):
+        with self.lock:
+            return [(name, family["type"], family["help"], list(family["children"].items()))
+                    for name, family in sorted(self.families.items())]
+
+    def snapshot(self):
+        """JSON-ready {name: {"type", "help", "values": [{"labels", "value"}]}}."""
+        return {name: {"type": kind, "help": help, "values": [{"labels": dict(key), "value": metric.snapshot()}
+                                                             for key, metric in children]}
+                for name, kind, help, children in self._items()}
+
+    def render_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for name, kind, help, children in self._items():
+            if help:
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, metric in children:
+                if kind != "histogram":
+                    lines.append(f"{name}{_labels(key)} {metric.snapshot()}")
+                    continue
+                snapshot = metric.snapshot()
+                for bound, count in snapshot["buckets"]:
+                    lines.append(f"{name}_bucket{_labels(key + (('le', repr(bound)),))} {count}")
+                lines.append(f"{name}_bucket{_labels(key + (('le', '+Inf'),))} {snapshot['count']}")
+                lines.append(f"{name}_sum{_labels(key)} {snapshot['sum']!r}")
+                lines.append(f"{name}_count{_labels(key)} {snapshot['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(key):
+    if not key:
+        return ""
+    return "{" + ",".join(f'{label}="{_escape(value)}"' for label, value in key) + "}"
+
+
+# Process-wide registry the pipeline, database and capture code report into
+REGISTRY = MetricsRegistry()
+
+
+def start_metrics_server(port=9108, host="127.0.0.1", registry=REGISTRY):
+    """Serve /metrics (Prometheus text) and /metrics.json from a daemon thread; returns the server."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = registry.render_prometheus(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = json.dumps(registry.snapshot()), "application/json"
+            else:
+                self.send_error(404)
+                return
+            body = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+class MetricsDumper(threading.Thread):
+    """Writes the registry snapshot to a JSON file every ``interval`` seconds (atomically)."""
+
+    def __init__(self, path, interval=15.0, registry=REGISTRY):
+        super().__init__(name="metrics-dump", daemon=True)
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.dump()
+
+    def dump(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"time": time.time(), "metrics": self.registry.snapshot()}, f)
+        os.replace(tmp_path, self.path)
+
+    def stop(self):
+        self.stopped.set()
+        self.dump()
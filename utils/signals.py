@@ -0,0 +1,26 @@
+class Signal:
+    """Synchronous callback list with the connect/emit API of pyqtSignal.
+
+    Lets recognition code notify the GUI or the headless service without
+    depending on Qt. Slots run in the emitting thread.
+    """
+
+    def __init__(self):
+        self._slots = []
+
+    def connect(self, slot):
+        self._slots.append(slot)
+
+    def disconnect(self, slot=None):
+        if slot is None:
+            self._slots.clear()
+        elif slot in self._slots:
+            self._slots.remove(slot)
+
+    def has_slots(self):
+        """Lets emitters skip building a payload nobody listens to."""
+        return bool(self._slots)
+
+    def emit(self, *args):
+        for slot in list(self._slots):
+            slot(*args)
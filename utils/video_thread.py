@@ -1,42 +1,31 @@
-import cv2
-import numpy as np
 from PyQt6.QtCore import QThread, pyqtSignal
 
+from utils.capture import CaptureSource
+
 
 class VideoThread(QThread):
-    change_pixmap_signal = pyqtSignal(np.ndarray)
+    """Runs a CaptureSource on a Qt thread; consumers pull the newest frame with latest()."""
     error_signal = pyqtSignal(str)
 
-    def __init__(self):
+    def __init__(self, source=0, width=640, height=480, **capture_options):
         super().__init__()
-        self.running = True
-        self.width = 640
-        self.height = 480
+        self.capture = CaptureSource(source, width=width, height=height, name="video-thread", **capture_options)
+        self.capture.error_signal.connect(self.error_signal.emit)
 
     def run(self):
         try:
-            cap = cv2.VideoCapture(0)
-            if not cap.isOpened():
-                self.error_signal.emit("Error: Unable to open camera")
-                return
-
-            cap.set(3, self.width)
-            cap.set(4, self.height)
-
-            while self.running:
-                ret, frame = cap.read()
-                if ret:
-                    self.change_pixmap_signal.emit(frame)
-                else:
-                    self.error_signal.emit("Error: Failed to capture frame")
-                    break
-
-                self.msleep(30)  # Limit to about 30 FPS
-
-            cap.release()
+            self.capture.run()
         except Exception as e:
             self.error_signal.emit(f"Camera error: {str(e)}")
 
+    def latest(self, since=None, max_age=None):
+        return self.capture.latest(since, max_age)
+
+    @property
+    def running(self):
+        return self.capture.running
+
     def stop(self):
-        self.running = False
-        self.wait()
\ No newline at end of file
+        self.capture.running = False
+        self.wait()
+        self.capture.stop()